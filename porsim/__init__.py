@@ -15,4 +15,16 @@ from ._layer import Layer
 from ._builder import Builder, Filler
 from ._cuboid import Cuboid
 from ._block import Block, Mean
-from ._solver import BaseSolver
\ No newline at end of file
+from ._solver import BaseSolver
+from ._backend import Direct, Krylov
+from ._multigrid import Multigrid
+from ._stencil import Stencil
+from ._impes import IMPES
+from ._simsol import SimSol
+from ._fimsol import FIMSol
+from ._color import Coloring
+from ._cpr import CPR
+from ._recorder import Recorder
+from ._checkpoint import Checkpoint
+from ._state import State
+from ._ensemble import Ensemble
\ No newline at end of file
@@ -0,0 +1,166 @@
+import logging
+
+import numpy
+
+from scipy.sparse import linalg
+
+class Backend:
+    """Base class of the linear solver backends."""
+
+    def __init__(self):
+        """Initialization of solution statistics."""
+        self.niter = 0    # number of iterations in the last solve
+        self.error = None # relative residual norm of the last solve
+
+    @staticmethod
+    def residual(LHS,RHS,x):
+        """Returns the relative residual norm of the solution x."""
+        scale = numpy.linalg.norm(RHS)
+
+        return numpy.linalg.norm(RHS-LHS.dot(x))/(scale if scale>0 else 1.)
+
+    def columns(self,LHS,RHS,x0=None,cache=None):
+        """Returns the solutions of the right hand side columns, RHS (N,k),
+        solved one by one, sharing the cached matrix and preconditioner.
+        The initial guess, x0, is a column or a block of k columns."""
+        cache = {} if cache is None else cache
+
+        x0 = [None]*RHS.shape[1] if x0 is None else numpy.broadcast_to(numpy.reshape(x0,(RHS.shape[0],-1)),RHS.shape).T
+
+        return numpy.column_stack([self(LHS,column,guess,cache) for column,guess in zip(RHS.T,x0)])
+
+class Direct(Backend):
+    """Direct sparse LU solution of the linear system."""
+
+    def __call__(self,LHS,RHS,x0=None,cache=None):
+        """Returns the solution of LHS x = RHS.
+
+        LHS     : sparse matrix, or callable returning it
+        RHS     : right hand side vector, or (N,k) block solved with
+                  the same LU factors at once
+        x0      : initial guess, not used by the direct solver
+        cache   : dictionary dedicated to the LHS matrix for storing
+                  its LU factors between the calls
+        """
+        cache = {} if cache is None else cache
+
+        if "solve" not in cache:
+            cache["LHS"] = LHS() if callable(LHS) else LHS
+            cache["solve"] = linalg.factorized(cache["LHS"].tocsc())
+
+        x = cache["solve"](RHS)
+
+        self.niter,self.error = 1,self.residual(cache["LHS"],RHS,x)
+
+        return x
+
+class Krylov(Backend):
+    """Preconditioned Krylov subspace solution of the linear system."""
+
+    METHODS = {
+        "cg"        : linalg.cg,
+        "bicgstab"  : linalg.bicgstab,
+        "gmres"     : linalg.gmres,
+        }
+
+    def __init__(self,method:str="cg",precond="jacobi",*,rtol:float=1e-8,maxiter:int=None,warm:bool=True,**kwargs):
+        """
+        Initialization of Krylov solver backend.
+
+        method  : one of "cg", "bicgstab" or "gmres". CG requires a
+                  symmetric positive definite LHS such as T+J+A.
+
+        precond : "ilu", "jacobi", None, or a callable returning
+                  the preconditioner (LinearOperator) for the LHS.
+                  ILU is not symmetric, use it with bicgstab or gmres.
+
+        rtol    : relative tolerance of the residual norm.
+
+        maxiter : maximum number of iterations.
+
+        warm    : if True, the solution starts from the initial guess,
+                  x0, usually the previous time step's pressure.
+
+        **kwargs are passed to spilu, e.g., drop_tol and fill_factor.
+
+        """
+        self.method = method
+        self.precond = precond
+
+        self.rtol = rtol
+        self.maxiter = maxiter
+        self.warm = warm
+
+        self.kwargs = kwargs
+
+        super().__init__()
+
+    @property
+    def method(self):
+        return self._method
+
+    @method.setter
+    def method(self,value):
+        """Setter for the Krylov method. Ensures that it is in METHODS."""
+        if value not in self.METHODS:
+            raise ValueError(f"Invalid Krylov method: {value}. Must be one of {set(self.METHODS)}.")
+        self._method = value
+
+    def __call__(self,LHS,RHS,x0=None,cache=None):
+        """Returns the solution of LHS x = RHS.
+
+        LHS     : sparse matrix or LinearOperator, or callable returning it
+        RHS     : right hand side vector, or (N,k) block of columns
+        x0      : initial guess for warm-starting
+        cache   : dictionary dedicated to the LHS matrix for storing
+                  the matrix and its preconditioner between the calls
+        """
+        cache = {} if cache is None else cache
+
+        if numpy.ndim(RHS)==2:
+            return self.columns(LHS,RHS,x0,cache)
+
+        if "LHS" not in cache:
+            cache["LHS"] = LHS() if callable(LHS) else LHS
+            cache["M"] = self.operator(cache["LHS"])
+
+        x0 = None if x0 is None or not self.warm else numpy.ravel(x0)
+
+        self.niter = 0
+
+        def counter(*args):
+            self.niter += 1
+
+        options = dict(callback_type="pr_norm") if self.method=="gmres" else {}
+
+        x,info = self.METHODS[self.method](cache["LHS"],RHS,x0=x0,rtol=self.rtol,
+            maxiter=self.maxiter,M=cache["M"],callback=counter,**options)
+
+        self.error = self.residual(cache["LHS"],RHS,x)
+
+        if info>0:
+            logging.warning(f"{self.method} did not converge in {self.niter} iterations, relative residual is {self.error:.3e}.")
+
+        return x
+
+    def operator(self,LHS):
+        """Returns the preconditioner of LHS as a LinearOperator."""
+        if self.precond is None:
+            return None
+
+        if callable(self.precond):
+            return self.precond(LHS)
+
+        if self.precond=="ilu":
+            ilu = linalg.spilu(LHS.tocsc(),**self.kwargs)
+            return linalg.LinearOperator(LHS.shape,matvec=ilu.solve)
+
+        if self.precond=="jacobi":
+            inverse = 1/LHS.diagonal()
+            return linalg.LinearOperator(LHS.shape,matvec=lambda x: inverse*numpy.ravel(x))
+
+        raise ValueError(f"Invalid preconditioner: {self.precond}. Must be 'ilu', 'jacobi', None or callable.")
+
+if __name__ == "__main__":
+
+    pass
@@ -30,15 +30,60 @@ class Block(Cuboid):
         return avect*self._tcomp
 
     def Tvec(self):
-        """Returns xflux, yflux, and zflux in tuple."""
+        """Returns xflux, yflux, and zflux in tuple. Face geometric
+        transmissibilities are precomputed when the rock is set, so only
+        the upwinded mobility is evaluated here."""
         fluid = (self._mobil,self._power)
 
-        xvect = self.mean.diffuse(self._xflow,*fluid,self._xneg,self._xpos)
-        yvect = self.mean.diffuse(self._yflow,*fluid,self._yneg,self._ypos)
-        zvect = self.mean.diffuse(self._zflow,*fluid,self._zneg,self._zpos)
+        xvect = self._xcond*self.mean.mobility(*fluid,self._xneg,self._xpos)
+        yvect = self._ycond*self.mean.mobility(*fluid,self._yneg,self._ypos)
+        zvect = self._zcond*self.mean.mobility(*fluid,self._zneg,self._zpos)
 
         return xvect,yvect,zvect
 
+    def Dvec(self,dmobil):
+        """Returns the derivatives of x, y and z face fluxes with respect to
+        the upwind grid pressure, and the upwind sides (True where the
+        positive side grid is upwind) in tuples. Input dmobil is the
+        pressure derivative of the block mobility."""
+        fluid = (dmobil,self.fluid._press-self._hhead)
+
+        xside = self.mean.upwind(self._power,self._xneg,self._xpos)
+        yside = self.mean.upwind(self._power,self._yneg,self._ypos)
+        zside = self.mean.upwind(self._power,self._zneg,self._zpos)
+
+        xvect = self._xcond*self.mean.dflux(*fluid,xside,self._xneg,self._xpos)
+        yvect = self._ycond*self.mean.dflux(*fluid,yside,self._yneg,self._ypos)
+        zvect = self._zcond*self.mean.dflux(*fluid,zside,self._zneg,self._zpos)
+
+        return (xvect,yvect,zvect),(xside,yside,zside)
+
+    def derivative(self,delta:float=10.):
+        """Returns the pressure derivatives of the block mobility and total
+        compressibility. The properties are cell-local, so all the grids are
+        perturbed at once and a single property evaluation is needed.
+        Input delta is the pressure perturbation in Pa."""
+        press,mobil,tcomp = self.fluid._press,self._mobil,self._tcomp
+
+        derived = "tcomp" in self._stamps # else a constant is given
+
+        self.fluid._press = press+delta
+        self.fluid = self.fluid
+
+        if derived:
+            self.tcomp = None
+
+        dmobil = (self._mobil-mobil)/delta
+        dtcomp = (self._tcomp-tcomp)/delta
+
+        self.fluid._press = press
+        self.fluid = self.fluid
+
+        if derived:
+            self.tcomp = None
+
+        return dmobil,dtcomp
+
     def Wvec(self,wells):
         """Returns productivity for all active wells."""
         prods,wells = [],() if wells is None else wells
@@ -101,6 +146,22 @@ class Mean:
         """Computes the upwinded mean of two terms based on phase potential (ppot) values."""
         return np.where(ppot1<ppot2,term2,term1)
 
+    @staticmethod
+    def mobility(mobil,power,_neg,_pos):
+        """Helper function to compute upwinded mobility at the faces."""
+        return Mean.upwinded(mobil[_neg],mobil[_pos],power[_neg],power[_pos])
+
+    @staticmethod
+    def upwind(power,_neg,_pos):
+        """Returns True at the faces where the positive side grid is upwind."""
+        return power[_neg]<power[_pos]
+
+    @staticmethod
+    def dflux(dmobil,poten,side,_neg,_pos):
+        """Helper function to compute upwind mobility derivative times the
+        potential difference at the faces."""
+        return np.where(side,dmobil[_pos],dmobil[_neg])*(poten[_pos]-poten[_neg])
+
     @staticmethod
     def diffuse(flow_,mobil,power,_neg,_pos):
         """Helper function to compute mean harmonic and upwinded mobility product."""
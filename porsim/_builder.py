@@ -4,6 +4,9 @@ from scipy.sparse import csr_matrix as csr
 
 from ._vector import Vector
 from ._matrix import Matrix
+from ._stencil import Stencil
+from ._table import Table
+from ._color import Coloring
 
 class Builder():
 
@@ -11,10 +14,21 @@ class Builder():
         """Initialization of matrix building class."""
         self.grids = grids
 
+        self._tpattern = None
+        self._tstencil = None
+
+        self._cells = None # active grid indices, all grids if None
+        self._apattern = None
+
     def __getattr__(self,key):
         """Delegates attribute access to the underlying grid object."""
         return getattr(self.grids,key)
 
+    @property
+    def shape(self):
+        """Returns the number of grids in x, y and z directions."""
+        return (self.xnums,self.ynums,self.znums)
+
     @property
     def square(self):
         """Returns the shape of square matrices in the flow calculations."""
@@ -28,58 +42,244 @@ class Builder():
     @property
     def filler(self):
         return Filler
+
+    @property
+    def tpattern(self):
+        """Returns the face connectivity and sparsity pattern of T matrix,
+        computed once per grid."""
+        if self._tpattern is None:
+            self._tpattern = Pattern(self.nums,
+                (self.xneg,self.yneg,self.zneg),
+                (self.xpos,self.ypos,self.zpos))
+
+        return self._tpattern
+
+    @property
+    def apattern(self):
+        """Returns the pattern of the faces between the active grids with
+        the grids renumbered, the kept faces of each axis, and the new
+        numbers of all grids (-1 for inactive), computed once per grid."""
+        if self._apattern is None:
+            renum = numpy.full(self.nums,-1,dtype=numpy.int64)
+            renum[self._cells] = numpy.arange(self._cells.size)
+
+            negs,poss = (self.xneg,self.yneg,self.zneg),(self.xpos,self.ypos,self.zpos)
+
+            keeps = tuple((renum[neg]>=0)&(renum[pos]>=0) for neg,pos in zip(negs,poss))
+
+            pattern = Pattern(self._cells.size,
+                tuple(renum[neg][keep] for neg,keep in zip(negs,keeps)),
+                tuple(renum[pos][keep] for pos,keep in zip(poss,keeps)))
+
+            self._apattern = (pattern,keeps,renum)
+
+        return self._apattern
+
+    def activate(self,cells=None):
+        """Sets the active grids, as a boolean mask or indices, the system
+        is built and solved on; None activates all the grids."""
+        if cells is None:
+            self._cells = None
+        else:
+            cells = numpy.asarray(cells)
+            self._cells = numpy.flatnonzero(cells) if cells.dtype==bool else numpy.unique(cells).astype(numpy.int64)
+
+        self._apattern = None
+
+    @property
+    def tstencil(self):
+        """Returns the positions of faces in the structured 7-point stencil
+        arrays, computed once per grid."""
+        if self._tstencil is None:
+            self._tstencil = Stencil.slots(self.shape,self.xneg,self.yneg,self.zneg)
+
+        return self._tstencil
     
-    def matrix(self,vec:Vector):
-        """Returns matrices to be used in the solver."""
+    def matrix(self,vec:Vector,free:bool=False):
+        """Returns matrices to be used in the solver. If free is True,
+        T is the matrix-free stencil operator instead of CSR matrix."""
+        if self._cells is not None:
+
+            if free:
+                raise ValueError("Matrix-free T is applied on all the grids, it cannot be used with active grids.")
+
+            return self.compress(vec)
+
         A = self.Amat(vec)
-        T = self.Tmat(vec)
+        T = self.Tfree(vec) if free else self.Tmat(vec)
         G = self.Gmat(T)
-        J = self.Jmat(vec)
-        Q = self.Qmat(vec)
+
+        table = self.table(vec)
+
+        J = self.Jmat(vec,table)
+        Q = self.Qmat(vec,table)
 
         return Matrix(A,T,G,J,Q)
 
+    def compress(self,vec:Vector):
+        """Returns matrices built on the active grids only. The faces to
+        inactive grids are dropped, and the constraint rows in inactive
+        grids are ignored, rates are allocated to the active ones."""
+        pattern,keeps,renum = self.apattern
+
+        nums,index = self._cells.size,numpy.arange(self._cells.size)
+
+        A = csr((vec._A[self._cells],(index,index)),shape=(nums,nums))
+        T = pattern.tmatrix(*(values[keep] for values,keep in zip((vec._X,vec._Y,vec._Z),keeps)))
+        G = T.dot(self._hhead[self._cells].reshape((-1,1)))
+
+        table = self.table(vec).subset(renum)
+
+        mat = Matrix(A,T,G,table.jmatrix((nums,nums)),table.qmatrix((nums,1)))
+
+        mat._cells,mat._nums = self._cells,self.nums
+
+        return mat
+
     def Amat(self,vec:Vector):
         """Returns Accumulation matrix filled with diagonal values."""
         return csr((vec._A,(self.index,self.index)),shape=self.square)
 
     def Tmat(self,vec:Vector):
         """Returns Transmissibility matrix filled with diagonal and offset values."""
-        matrix = csr(self.square)
+        return self.tpattern.tmatrix(vec._X,vec._Y,vec._Z)
 
-        matrix = self.filler.tmatrix(matrix,vec._X,self.xneg,self.xpos)
-        matrix = self.filler.tmatrix(matrix,vec._Y,self.yneg,self.ypos)
-        matrix = self.filler.tmatrix(matrix,vec._Z,self.zneg,self.zpos)
+    def Tfree(self,vec:Vector):
+        """Returns matrix-free Transmissibility operator of 7-point stencil."""
+        return Stencil.build(self.shape,self.tstencil,vec._X,vec._Y,vec._Z)
 
-        return matrix
+    def Dmat(self,faces:tuple,sides:tuple):
+        """Returns the matrix of upwind mobility derivatives of face fluxes,
+        sharing the sparsity pattern of T matrix."""
+        return self.tpattern.dmatrix(self.tpattern.faces(*faces),self.tpattern.faces(*sides))
 
     def Gmat(self,tmatrix):
         """Returns Gravity column matrix filled with gravity related terms."""
         return tmatrix.dot(self._hhead.reshape((-1,1)))
 
-    def Jmat(self,vec:Vector):
-        """Returns J matrix filled with constant pressure constraints on diagonal."""
-        matrix = csr(self.square)
+    def indices(self,wells=None,edges=None):
+        """Returns the grid indices of well and edge constraints in a list."""
+        indices = [numpy.asarray(well.index) for well in (wells or ())]
+        indices += [self.index[getattr(self,f"_{edge.face}")] for edge in (edges or ())]
 
-        for well in vec._W:
-            matrix += self.filler.jmatrix(matrix,well)
+        return indices
 
-        for edge in vec._B:
-            matrix += self.filler.jmatrix(matrix,edge)
+    def table(self,vec:Vector):
+        """Returns the columnar table of well and edge constraints."""
+        constrs = tuple(vec._W)+tuple(vec._B)
 
-        return matrix
+        return Table.stack(constrs,self.indices(vec._W,vec._B))
+
+    def coloring(self,wells=None,edges=None):
+        """Returns distance-2 coloring of the Jacobian sparsity: the 7-point
+        stencil plus the couplings among the grids of each rate constraint,
+        which share the rate in proportion to their productivity."""
+        constrs = tuple(wells or ())+tuple(edges or ())
+
+        rows,cols = [self.tpattern.neg,self.tpattern.pos],[self.tpattern.pos,self.tpattern.neg]
+
+        for constr,index in zip(constrs,self.indices(wells,edges)):
+            if constr.sort!="press":
+                rows.append(numpy.repeat(index,index.size))
+                cols.append(numpy.tile(index,index.size))
+
+        rows,cols = numpy.concatenate(rows),numpy.concatenate(cols)
+
+        return Coloring(self.nums,rows,cols,Coloring.seed(self.shape))
+
+    def Jmat(self,vec:Vector,table:Table=None):
+        """Returns J matrix filled with constant pressure constraints on diagonal."""
+        table = self.table(vec) if table is None else table
+
+        return table.jmatrix(self.square)
 
-    def Qmat(self,vec:Vector):
+    def Qmat(self,vec:Vector,table:Table=None):
         """Returns Q column matrix filled with constraints."""
-        matrix = csr(self.column)
+        table = self.table(vec) if table is None else table
 
-        for well in vec._W:
-            matrix += self.filler.qmatrix(matrix,well)
+        return table.qmatrix(self.column)
 
-        for edge in vec._B:
-            matrix += self.filler.qmatrix(matrix,edge)
+class Pattern:
+    """Face connectivity and CSR sparsity pattern of the transmissibility
+    matrix. Each face contributes four entries: (neg,neg) and (pos,pos)
+    with positive sign, (neg,pos) and (pos,neg) with negative sign."""
 
-        return matrix
+    def __init__(self,nums:int,neg:tuple,pos:tuple):
+        """
+        nums    : number of grids, the size of square matrix
+        neg     : tuple of face negative-side grid indices per axis
+        pos     : tuple of face positive-side grid indices per axis
+        """
+        self.nums = nums
+
+        self.sizes = tuple(len(face) for face in neg)
+
+        self.neg = numpy.concatenate(neg).astype(numpy.int64)
+        self.pos = numpy.concatenate(pos).astype(numpy.int64)
+
+        index = numpy.arange(nums,dtype=numpy.int64)
+
+        rows = numpy.concatenate((index,self.neg,self.pos))
+        cols = numpy.concatenate((index,self.pos,self.neg))
+
+        # unique row-major keys are already in CSR order; inverse maps
+        # every entry to its position in the CSR data array
+        keys,order = numpy.unique(rows*nums+cols,return_inverse=True)
+
+        itype = numpy.int32 if max(nums,keys.size)<2**31 else numpy.int64
+
+        order = order.ravel()
+
+        self.diag = order[:nums]
+        self.offneg = order[nums:nums+self.neg.size]
+        self.offpos = order[nums+self.neg.size:]
+
+        self.indices = (keys%nums).astype(itype)
+        self.indptr = numpy.zeros(nums+1,dtype=itype)
+
+        numpy.cumsum(numpy.bincount(keys//nums,minlength=nums),out=self.indptr[1:])
+
+    @property
+    def nnz(self):
+        """Returns the number of stored entries in the T matrix."""
+        return self.indices.size
+
+    def faces(self,*values):
+        """Returns face values of all axes stacked in a single array."""
+        return numpy.concatenate(values)
+
+    def tmatrix(self,*values):
+        """Returns T matrix assembled in a single pass over the faces. The
+        matrix shares the sparsity pattern arrays, only data is new."""
+        faces = self.faces(*values)
+
+        data = numpy.empty(self.nnz)
+
+        data[self.offneg] = -faces
+        data[self.offpos] = -faces
+
+        data[self.diag] = numpy.bincount(self.neg,weights=faces,minlength=self.nums)
+        data[self.diag] += numpy.bincount(self.pos,weights=faces,minlength=self.nums)
+
+        return csr((data,self.indices,self.indptr),shape=(self.nums,)*2)
+
+    def dmatrix(self,values,sides):
+        """Returns the matrix of face derivative values taken with respect
+        to the upwind grid, in the T pattern. The value is added to the
+        (neg,up) entry and subtracted from the (pos,up) entry, where up is
+        the positive side grid if sides is True, the negative otherwise."""
+        neg = numpy.where(sides,0.,values)
+        pos = numpy.where(sides,values,0.)
+
+        data = numpy.empty(self.nnz)
+
+        data[self.offneg] = pos
+        data[self.offpos] = -neg
+
+        data[self.diag] = numpy.bincount(self.neg,weights=neg,minlength=self.nums)
+        data[self.diag] -= numpy.bincount(self.pos,weights=pos,minlength=self.nums)
+
+        return csr((data,self.indices,self.indptr),shape=(self.nums,)*2)
 
 class Filler:
 
@@ -99,7 +299,7 @@ class Filler:
         """Returns updated J diagonal matrix."""
         if constr.sort=="press":
             vector = (constr._prod,(constr.index,constr.index))
-            matrix = csr(vector,shape=matrix.shape)
+            matrix = matrix+csr(vector,shape=matrix.shape)
 
         return matrix
 
@@ -112,7 +312,7 @@ class Filler:
             vector /= constr._prod.sum()
 
         vector = (vector,(constr.index,numpy.zeros_like(constr.index)))
-        matrix = csr(vector,shape=matrix.shape)
+        matrix = matrix+csr(vector,shape=matrix.shape)
 
         return matrix
         
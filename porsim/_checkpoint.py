@@ -0,0 +1,40 @@
+import os
+
+import numpy
+
+class Checkpoint:
+    """Periodic checkpoints of the solver state in compressed .npz files,
+    so that an interrupted run restarts from the last saved time step and
+    continues with the same results."""
+
+    def __init__(self,path:str,every:int=10):
+        """
+        path    : checkpoint file, .npz extension is added if missing.
+        every   : checkpoint interval in time steps.
+        """
+        self.path = path if path.endswith(".npz") else f"{path}.npz"
+
+        self.every = every
+
+    def due(self,index:int):
+        """Returns True if the state after the time step index is saved."""
+        return index%self.every==0
+
+    def save(self,index:int,time:float,**state):
+        """Saves the state after the time step index at time (sec). The file
+        is replaced only after it is completely written."""
+        temp = f"{self.path[:-4]}.tmp.npz"
+
+        numpy.savez_compressed(temp,index=index,time=time,**state)
+
+        os.replace(temp,self.path)
+
+    @staticmethod
+    def load(path:str):
+        """Returns the saved state in a dictionary, scalars as 0-d arrays."""
+        with numpy.load(path) as data:
+            return {key:data[key] for key in data.files}
+
+if __name__ == "__main__":
+
+    pass
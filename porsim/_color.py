@@ -0,0 +1,114 @@
+import numpy
+
+from scipy.sparse import csr_matrix as csr
+
+class Coloring:
+    """Distance-2 coloring of the Jacobian sparsity graph, so that columns of
+    the same color share no row and can be perturbed together. The Jacobian
+    is then recovered from (number of colors + 1) residual evaluations."""
+
+    def __init__(self,nums:int,rows,cols,seed=None):
+        """
+        nums    : number of grids, the size of square Jacobian
+        rows    : row indices of the structural nonzeros
+        cols    : column indices of the structural nonzeros, the pattern
+                  must be symmetric; the diagonal is always included
+        seed    : initial colors of the grids, e.g., Coloring.seed(shape),
+                  conflicts are repaired greedily
+        """
+        index = numpy.arange(nums)
+
+        rows = numpy.concatenate((index,numpy.asarray(rows,dtype=numpy.int64)))
+        cols = numpy.concatenate((index,numpy.asarray(cols,dtype=numpy.int64)))
+
+        self.pattern = csr((numpy.ones(rows.size,dtype=bool),(rows,cols)),shape=(nums,nums))
+
+        self.pattern.sum_duplicates()
+
+        seed = numpy.zeros(nums,dtype=numpy.int64) if seed is None else numpy.array(seed,dtype=numpy.int64)
+
+        self.colors = self.repair(self.pattern,seed)
+
+    @property
+    def nums(self):
+        """Returns the number of colors."""
+        return int(self.colors.max())+1
+
+    @staticmethod
+    def seed(shape):
+        """Returns the coloring of 7-point stencil on structured grids with
+        x-index changing fastest: (i+2j+3k) mod 7 in 3D, (i+2j) mod 5 in 2D
+        and i mod 3 in 1D, counting only the axes with more than one grid."""
+        index = numpy.arange(int(numpy.prod(shape)))
+
+        colors,weight = numpy.zeros(index.size,dtype=numpy.int64),1
+
+        for axis,nums in enumerate(shape):
+
+            if nums>1:
+                colors += weight*((index//int(numpy.prod(shape[:axis])))%nums)
+                weight += 1
+
+        return colors%(2*weight-1)
+
+    @staticmethod
+    def repair(pattern:csr,colors):
+        """Returns the colors after greedily recoloring the columns that share
+        a row with a column of the same color."""
+        rows = numpy.repeat(numpy.arange(pattern.shape[0]),numpy.diff(pattern.indptr))
+
+        # sorting the nonzeros by row and color places conflicts side by side
+        order = numpy.lexsort((pattern.indices,colors[pattern.indices],rows))
+
+        rows,cols = rows[order],pattern.indices[order]
+
+        conflict = (rows[1:]==rows[:-1])&(colors[cols[1:]]==colors[cols[:-1]])
+
+        invalid = numpy.unique(cols[1:][conflict])
+
+        colors[invalid] = -1
+
+        for col in invalid:
+
+            neighbors = pattern.indices[pattern.indptr[col]:pattern.indptr[col+1]]
+
+            # the pattern is symmetric, so rows of the column are its neighbors
+            index = numpy.concatenate([pattern.indices[pattern.indptr[row]:pattern.indptr[row+1]] for row in neighbors])
+
+            used = numpy.unique(colors[index])
+
+            free = numpy.setdiff1d(numpy.arange(used.size+1),used)
+
+            colors[col] = free[0]
+
+        return colors
+
+    def jacobian(self,function,x,delta:float=10.,fx=None):
+        """Returns the finite-difference Jacobian of function at x in CSR
+        format, perturbing all the columns of a color at once.
+
+        function: callable returning the residual vector
+        delta   : perturbation size, in the units of x
+        fx      : function value at x, evaluated if not given
+        """
+        x = numpy.ravel(x)
+
+        fx = numpy.ravel(function(x)) if fx is None else numpy.ravel(fx)
+
+        rows = numpy.repeat(numpy.arange(x.size),numpy.diff(self.pattern.indptr))
+        cols = self.pattern.indices
+
+        # each row holds at most one column of a given color
+        diffs = numpy.empty((self.nums,x.size))
+
+        for color in range(self.nums):
+            step = numpy.where(self.colors==color,delta,0.)
+            diffs[color] = (numpy.ravel(function(x+step))-fx)/delta
+
+        data = diffs[self.colors[cols],rows]
+
+        return csr((data,cols,self.pattern.indptr),shape=self.pattern.shape)
+
+if __name__ == "__main__":
+
+    pass
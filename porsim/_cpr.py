@@ -0,0 +1,110 @@
+import numpy
+
+from scipy.sparse import csr_matrix as csr
+from scipy.sparse import linalg
+
+class CPR:
+    """Constrained Pressure Residual preconditioner of coupled systems with
+    (p,Sw) unknowns and (water,oil) equations interleaved per grid, e.g.,
+    FIMSol Jacobian. It is used as the Krylov preconditioner factory,
+    Krylov("gmres",precond=CPR()).
+
+    The first stage solves the pressure system decoupled with quasi-IMPES
+    weights, the second stage smooths the remaining residual of the full
+    system."""
+
+    def __init__(self,pressure=None,smoother:str="ilu",**kwargs):
+        """
+        pressure: callable returning the pressure solver (LinearOperator)
+                  for the decoupled pressure matrix, e.g., the operator of
+                  Multigrid; default is the direct LU solution.
+
+        smoother: second stage, "ilu" for the incomplete LU of the full
+                  system or "jacobi" for the inverse of the 2x2 diagonal
+                  blocks.
+
+        **kwargs are passed to spilu, e.g., drop_tol and fill_factor.
+        """
+        self.pressure = pressure
+        self.smoother = smoother
+
+        self.kwargs = kwargs
+
+    def __call__(self,LHS):
+        """Returns the two-stage preconditioner of LHS as LinearOperator."""
+        LHS = LHS.tocsr()
+
+        W,P = self.weights(LHS)
+
+        psolve = self.psolve((W.dot(LHS).dot(P)).tocsr())
+        smooth = self.smooth(LHS)
+
+        def matvec(x):
+            x = numpy.ravel(x)
+            y = P.dot(psolve(W.dot(x)))
+            return y+smooth(x-LHS.dot(y))
+
+        return linalg.LinearOperator(LHS.shape,matvec=matvec)
+
+    @staticmethod
+    def weights(LHS):
+        """Returns the quasi-IMPES decoupling weights, W, and the pressure
+        prolongation, P. The water equation is weighted by -d22/d12 from
+        the diagonal blocks, so that the saturation drops out of the
+        weighted sum of the equations, as in SimSol pressure equation."""
+        nums = LHS.shape[0]//2
+
+        d12 = LHS.diagonal(1)[0::2] # water equation, saturation derivative
+        d22 = LHS.diagonal()[1::2]  # oil equation, saturation derivative
+
+        ratio = numpy.divide(-d22,d12,out=numpy.zeros(nums),where=d12!=0)
+
+        index = numpy.arange(nums)
+
+        rows = numpy.concatenate((index,index))
+        cols = numpy.concatenate((2*index,2*index+1))
+
+        W = csr((numpy.concatenate((ratio,numpy.ones(nums))),(rows,cols)),shape=(nums,2*nums))
+        P = csr((numpy.ones(nums),(2*index,index)),shape=(2*nums,nums))
+
+        return W,P
+
+    def psolve(self,LHS):
+        """Returns the first stage solution function of pressure matrix."""
+        if self.pressure is None:
+            return linalg.factorized(LHS.tocsc())
+
+        operator = self.pressure(LHS)
+
+        return lambda x: operator.dot(x)
+
+    def smooth(self,LHS):
+        """Returns the second stage solution function of the full system."""
+        if self.smoother=="ilu":
+            return linalg.spilu(LHS.tocsc(),**self.kwargs).solve
+
+        if self.smoother=="jacobi":
+            blocks = LHS.tobsr(blocksize=(2,2))
+            inverse = numpy.linalg.inv(self.diagonal(blocks))
+            return lambda x: numpy.einsum("nij,nj->ni",inverse,x.reshape((-1,2))).ravel()
+
+        raise ValueError(f"Invalid smoother: {self.smoother}. Must be 'ilu' or 'jacobi'.")
+
+    @staticmethod
+    def diagonal(blocks):
+        """Returns the 2x2 diagonal blocks of the BSR matrix."""
+        nums = blocks.shape[0]//2
+
+        rows = numpy.repeat(numpy.arange(nums),numpy.diff(blocks.indptr))
+
+        diagonal = numpy.zeros((nums,2,2))
+
+        mask = rows==blocks.indices
+
+        diagonal[rows[mask]] = blocks.data[mask]
+
+        return diagonal
+
+if __name__ == "__main__":
+
+    pass
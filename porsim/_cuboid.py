@@ -11,6 +11,8 @@ class Cuboid(Builder):
         """Initialization of block (cell) calculation class."""
         super().__init__(grids)
 
+        self._stamps = {} # inputs of the last calculation of each property
+
         self.rrock = rrock
         self.fluid = fluid
 
@@ -22,6 +24,44 @@ class Cuboid(Builder):
         self.fluid = fluid # reservoir fluid properties
         self.tcomp = tcomp # total compressibility
 
+    def _stale(self,key:str,*inputs):
+        """Returns True, and stamps the inputs, if any of the inputs of the key
+        property changed since its last calculation. Arrays are compared by
+        identity, so assigning a new array marks the property stale; arrays
+        edited in place need invalidate."""
+        stamp = self._stamps.get(key)
+
+        if stamp is not None and all(self._same(old,new) for old,new in zip(stamp,inputs)):
+            return False
+
+        self._stamps[key] = inputs
+
+        return True
+
+    @staticmethod
+    def _same(old,new):
+        """Returns True if the input did not change: same object, or equal
+        scalars and single-valued arrays."""
+        if old is new:
+            return True
+
+        if numpy.size(old)!=1 or numpy.size(new)!=1:
+            return False
+
+        try:
+            return bool(old==new)
+        except (TypeError,ValueError):
+            return False
+
+    def invalidate(self,*keys):
+        """Marks the properties of the keys, "flow", "hhead", "power", "mobil"
+        or "tcomp", all if none is given, for recalculation at the next
+        assignment of rrock, fluid or tcomp, after their inputs are edited
+        in place."""
+        for key in keys or tuple(self._stamps):
+            if key in self._stamps:
+                self._stamps[key] = None
+
     @property
     def rrock(self):
         return self._rrock
@@ -34,11 +74,26 @@ class Cuboid(Builder):
 
         self._rrock = value
 
-        # Reset flow properties to indicate they need recalculation
+        # Recalculate flow properties only if permeability changed
+        if not self._stale("flow",value._xperm,value._yperm,value._zperm):
+            return
+
         self.xflow = None # Block transmissibility in x-direction
         self.yflow = None # Block transmissibility in y-direction
         self.zflow = None # Block transmissibility in z-direction
 
+        # Face geometric transmissibilities depend only on rock and grids
+        self.xcond = None # Face transmissibility in x-direction
+        self.ycond = None # Face transmissibility in y-direction
+        self.zcond = None # Face transmissibility in z-direction
+
+    def actives(self):
+        """Returns True for the grids with nonzero porosity and nonzero
+        permeability in any direction."""
+        perms = (self.rrock._xperm,self.rrock._yperm,self.rrock._zperm)
+
+        return (self.rrock._poro>0)&numpy.logical_or.reduce([numpy.asarray(perm)>0 for perm in perms])
+
     @property
     def xflow(self):
         """Getter for the rock transmissibility in x-direction."""
@@ -69,6 +124,47 @@ class Cuboid(Builder):
         """Setter for the rock transmissibility in z-direction."""
         self._zflow = (self.rrock._zperm*self._zarea)/(self._zdelta)
 
+    @staticmethod
+    def harmonic(flow1,flow2):
+        """Returns harmonic mean of the block transmissibilities, zero for
+        the faces between two impermeable blocks."""
+        total = flow1+flow2
+
+        return numpy.divide(2*flow1*flow2,total,out=numpy.zeros(numpy.shape(total)),where=total>0)
+
+    @property
+    def xcond(self):
+        """Getter for the face geometric transmissibility in x-direction."""
+        return self._xcond/(9.869233e-16*0.3048)
+
+    @xcond.setter
+    def xcond(self,value):
+        """Setter for the face geometric transmissibility in x-direction,
+        harmonic mean of the neighbor block transmissibilities."""
+        self._xcond = self.harmonic(self._xflow[self._xneg],self._xflow[self._xpos])
+
+    @property
+    def ycond(self):
+        """Getter for the face geometric transmissibility in y-direction."""
+        return self._ycond/(9.869233e-16*0.3048)
+
+    @ycond.setter
+    def ycond(self,value):
+        """Setter for the face geometric transmissibility in y-direction,
+        harmonic mean of the neighbor block transmissibilities."""
+        self._ycond = self.harmonic(self._yflow[self._yneg],self._yflow[self._ypos])
+
+    @property
+    def zcond(self):
+        """Getter for the face geometric transmissibility in z-direction."""
+        return self._zcond/(9.869233e-16*0.3048)
+
+    @zcond.setter
+    def zcond(self,value):
+        """Setter for the face geometric transmissibility in z-direction,
+        harmonic mean of the neighbor block transmissibilities."""
+        self._zcond = self.harmonic(self._zflow[self._zneg],self._zflow[self._zpos])
+
     @property
     def fluid(self):
         return self._fluid
@@ -80,11 +176,16 @@ class Cuboid(Builder):
             return
 
         self._fluid = value
-        
-        # Reset fluid properties to indicate they need recalculation
-        self.hhead = None # Block's hydrostatic head placeholder
-        self.power = None # Block's fluid potential (hydrostatic head + fluid pressure)
-        self.mobil = None # Block's fluid mobility
+
+        # Recalculate fluid properties only if their inputs changed
+        if self._stale("hhead",value._grad):
+            self.hhead = None # Block's hydrostatic head placeholder
+
+        if self._stale("power",value._press,self._hhead):
+            self.power = None # Block's fluid potential (hydrostatic head + fluid pressure)
+
+        if self._stale("mobil",value._mobil):
+            self.mobil = None # Block's fluid mobility
 
     @property
     def hhead(self):
@@ -129,10 +230,12 @@ class Cuboid(Builder):
         """Setter for the total compressibility."""
         if value is None:
             try:
-                self._tcomp = self.rrock._comp+self.fluid._comp
+                if self._stale("tcomp",self.rrock._comp,self.fluid._comp):
+                    self._tcomp = self.rrock._comp+self.fluid._comp
             except Exception as e:
                 logging.warning(f"Missing attribute when calculating total compressibility: {e}")
         else:
+            self._stamps.pop("tcomp",None)
             self._tcomp = value/6894.76
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+import copy
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy
+
+_worker = {} # solver and shared realization arrays of the worker process
+
+class Ensemble:
+    """Runs a solver over rock realizations sharing the grids, fluid, wells,
+    edges and time schedule. The realizations are placed once in shared
+    memory, the solver is sent once per worker process, and each task
+    returns only the summary outputs."""
+
+    FIELDS = ("_xperm","_yperm","_zperm","_poro")
+
+    def __init__(self,solver,time,pinit,*,workers:int=None,chunk:int=1,**kwargs):
+        """
+        solver  : IMPES instance with the grids, fluid, constraints and
+                  the base rock, whose other properties are shared.
+        time    : Time instance with the time steps.
+        pinit   : initial pressure in psi.
+        workers : number of worker processes, os.cpu_count() by default;
+                  with one worker, realizations are run in this process.
+        chunk   : number of realizations per task.
+
+        **kwargs are passed to IMPES.run, e.g., tstat and stepper.
+        """
+        self.solver = solver
+
+        self.time = time
+        self.pinit = pinit
+
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunk = chunk
+
+        self.kwargs = kwargs
+
+    def run(self,**realizations):
+        """Returns the summary outputs of the realizations in a dictionary:
+
+        rates   : inflows of wells and edges (m3/sec), (reals,steps+1,constrs)
+        press   : pore volume weighted field pressure (Pa), (reals,steps+1)
+
+        realizations are arrays of shape (reals,nums) replacing the rock
+        properties in SI units, any of _xperm, _yperm, _zperm and _poro.
+        """
+        for key in realizations:
+            if key not in self.FIELDS:
+                raise ValueError(f"Invalid realization property: {key}. Must be one of {self.FIELDS}.")
+
+        keys = tuple(realizations)
+
+        stack = numpy.stack([numpy.asarray(realizations[key],dtype=numpy.float64) for key in keys])
+
+        memory = shared_memory.SharedMemory(create=True,size=stack.nbytes)
+
+        try:
+            numpy.ndarray(stack.shape,dtype=numpy.float64,buffer=memory.buf)[:] = stack
+
+            chunks = [range(start,min(start+self.chunk,stack.shape[1])) for start in range(0,stack.shape[1],self.chunk)]
+
+            initargs = (memory.name,stack.shape,keys,self.solver,self.time,self.pinit,self.kwargs)
+
+            if self.workers==1:
+                self.attach(*initargs)
+                try:
+                    results = [self.simulate(chunk) for chunk in chunks]
+                finally:
+                    self.detach()
+            else:
+                with ProcessPoolExecutor(self.workers,initializer=self.attach,initargs=initargs) as pool:
+                    results = list(pool.map(self.simulate,chunks))
+
+        finally:
+            memory.close()
+            memory.unlink()
+
+        return dict(
+            rates = numpy.concatenate([rates for rates,_ in results]),
+            press = numpy.concatenate([press for _,press in results]),
+            )
+
+    @staticmethod
+    def attach(name,shape,keys,solver,time,pinit,kwargs):
+        """Initializes the worker with the solver and the shared arrays."""
+        memory = shared_memory.SharedMemory(name=name)
+
+        _worker.update(memory=memory,keys=keys,solver=solver,time=time,pinit=pinit,kwargs=kwargs,
+            rrock=solver.rrock,arrays=numpy.ndarray(shape,dtype=numpy.float64,buffer=memory.buf))
+
+    @staticmethod
+    def detach():
+        """Releases the shared arrays, restores the base rock and its active
+        grids, and clears the worker."""
+        solver = _worker["solver"]
+
+        solver.rrock = _worker.pop("rrock")
+
+        if solver.active is True:
+            solver.activate(solver.actives())
+
+        _worker.pop("arrays")
+        _worker.pop("memory").close()
+
+        _worker.clear()
+
+    @staticmethod
+    def simulate(indices):
+        """Returns the rates and field pressure of the realization indices."""
+        solver,steps = _worker["solver"],_worker["time"].nums+1
+
+        rates = numpy.zeros((len(indices),steps,len(solver.wells or ())+len(solver.edges or ())))
+        press = numpy.zeros((len(indices),steps))
+
+        for row,index in enumerate(indices):
+
+            rrock = copy.copy(_worker["rrock"])
+
+            for key,array in zip(_worker["keys"],_worker["arrays"]):
+                setattr(rrock,key,array[index])
+
+            solver.rrock = rrock
+
+            if solver.active is True: # the realization sets the inactive grids
+                solver.activate(solver.actives())
+
+            volume = solver._volume*rrock._poro
+
+            for state in solver.run(_worker["time"],_worker["pinit"],**_worker["kwargs"]):
+                rates[row,state.index] = state._rates
+                press[row,state.index] = numpy.dot(volume,state._press)/volume.sum()
+
+        return rates,press
+
+if __name__ == "__main__":
+
+    pass
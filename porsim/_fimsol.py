@@ -0,0 +1,338 @@
+import logging
+
+import numpy as np
+
+from scipy.sparse import coo_matrix
+from scipy.sparse import csr_matrix as csr
+
+from ._block import Mean
+from ._simsol import SimSol
+from ._checkpoint import Checkpoint
+
+class FIMSol(SimSol):
+    """Fully implicit solution of oil and water flow. Pressure and water
+    saturation are solved together with Newton iterations; unknowns are
+    ordered as (p,Sw) pairs per grid, so that the Jacobian is a 2x2 block
+    sparse (BSR) matrix."""
+
+    def __init__(self,res,fluids,relperm,wells,backend=None,*,maxiter=20,tol=1e-6,dsmax=0.2,aim=None):
+        """
+        maxiter : maximum number of Newton iterations per time step.
+        tol     : tolerance of the residual normalized by Vp/tstep, or
+                  of both the saturation update and the pressure update
+                  relative to the pressure.
+        dsmax   : maximum saturation change per Newton iteration, larger
+                  updates are chopped.
+        aim     : CFL threshold of the adaptive implicit method. If given,
+                  only the grids whose local CFL number exceeds it are
+                  implicit in saturation, the rest are IMPES. Default is
+                  None, all grids are fully implicit.
+
+        The rest of the inputs are the same as in SimSol.
+        """
+        super().__init__(res,fluids,relperm,wells,backend)
+
+        self.maxiter = maxiter
+        self.tol = tol
+        self.dsmax = dsmax
+
+        self.aim = aim
+
+        self.implicit = None # grids implicit in saturation at the last step
+
+    def solve(self,checkpoint=None,restart=None):
+        """Solves pressure and saturation implicitly at every time step.
+
+        checkpoint: Checkpoint instance saving the state at its interval
+                  of time steps.
+        restart : checkpoint file to continue from.
+        """
+        faces = self.faces()
+
+        start = 0 if restart is None else self.restore(Checkpoint.load(restart))
+
+        for index,time in enumerate(self.time_array):
+
+            if index<start:
+                continue
+
+            logging.info("@{:5.1f}th time step".format(time))
+
+            pn,Swn = self.pressure[:,index],self.Sw[:,index]
+
+            implicit = None if self.aim is None else self.select(pn,Swn,self.time_step,faces)
+
+            self.pressure[:,index+1],self.Sw[:,index+1] = self.newton(pn,Swn,self.time_step,faces,implicit)
+
+            if checkpoint is not None and checkpoint.due(index+1):
+                self.save(checkpoint,index+1)
+
+        for index,(p,sw) in enumerate(zip(self.pressure[:,-1],self.Sw[:,-1])):
+            logging.debug("{:d}\tP\t{:4.1f}\tSw\t{:.5f}".format(index,p,sw))
+
+    def save(self,checkpoint,index):
+        """Saves pressure, saturation and Newton statistics after the time
+        step index."""
+        checkpoint.save(index,self.time_array[index-1]+self.time_step,
+            pressure=self.pressure[:,index],Sw=self.Sw[:,index],stats=np.array([self.niter,self.error]))
+
+    def restore(self,state):
+        """Restores the state saved by save, and returns the time step
+        index to continue from."""
+        index = super().restore(state)
+
+        self.niter,self.error = int(state["stats"][0]),float(state["stats"][1])
+
+        return index
+
+    def select(self,p,Sw,tstep,faces):
+        """Returns True for the grids whose local CFL number, computed from
+        the throughput and pore volume at the beginning of the time step,
+        exceeds the aim threshold."""
+        neg,pos,tface = faces
+
+        Vp = self.res.grid_volumes*self.res.porosity
+
+        fvfw,fvfo = self.fluids.fvf[0],self.fluids.fvf[1]
+
+        krw,kro,_,_ = self.relperm(Sw)
+
+        upwind = np.where(Mean.upwind(p,neg,pos),pos,neg)
+
+        mobil = krw/self.fluids.viscosity[0]+kro/self.fluids.viscosity[1]
+
+        flux = tface*mobil[upwind]*6.33e-3*(p[neg]-p[pos]) # unit conversion
+
+        qw,qo = self.rates(p,Sw)
+
+        rate = self.throughput(flux,neg,pos,Sw.size,fvfw*qw+fvfo*qo)
+
+        fwmax = np.max(np.abs(np.diff(self.fractional(np.linspace(0,1,201)))))*200
+
+        return tstep*fwmax*rate/Vp>self.aim
+
+    def newton(self,pn,Swn,tstep,faces,implicit=None):
+        """Returns pressure and saturation at the end of the time step. The
+        number of iterations and normalized residual are kept in niter
+        and error. If implicit is given, saturation is implicit only in
+        those grids and is eliminated from the system elsewhere; with the
+        aim threshold, the grids whose CFL number exceeds it at the iterates
+        are added, as the fluxes develop over the time step."""
+        p,Sw = np.copy(pn),np.copy(Swn)
+
+        scale = np.repeat(self.res.grid_volumes*self.res.porosity/tstep,2)
+
+        for self.niter in range(1,self.maxiter+1):
+
+            R,J = self.system(p,Sw,pn,Swn,tstep,faces,implicit)
+
+            self.error = np.max(np.abs(R)/scale)
+
+            if self.error<self.tol:
+                break
+
+            if implicit is None or implicit.all():
+                delta = self.backend(J,-R)
+            else:
+                delta = self.eliminate(J,R,implicit)
+
+            dS = np.clip(delta[1::2],-self.dsmax,self.dsmax)
+
+            p += delta[0::2]
+            Sw = np.clip(Sw+dS,0,1)
+
+            if np.max(np.abs(dS))<self.tol and np.max(np.abs(delta[0::2]))<self.tol*np.max(np.abs(p)):
+                break
+
+            if implicit is not None and self.aim is not None:
+                implicit = implicit|self.select(p,Sw,tstep,faces)
+
+        else:
+
+            logging.warning(f"It could not converge after {self.maxiter} iterations, residual is {self.error:.3e}.")
+
+        self.implicit = implicit
+
+        return p,Sw
+
+    def eliminate(self,J,R,implicit):
+        """Returns the Newton update with the explicit grid saturations
+        eliminated. Their saturation appears only in their own accumulation,
+        so the water and oil equations are combined with -d22/d12 into a
+        pressure equation, and the saturation is recovered from the water
+        equation after the reduced solve."""
+        J = J.tocsr()
+
+        nums = implicit.size
+
+        d12 = J.diagonal(1)[0::2] # water equation, saturation derivative
+        d22 = J.diagonal()[1::2]  # oil equation, saturation derivative
+
+        index = np.arange(nums)
+
+        explicit = index[~implicit]
+
+        # reduced equations: both rows of implicit grids, and water rows
+        # of explicit grids combined with their oil rows
+        rows = np.concatenate((2*index[implicit],2*index[implicit]+1,2*explicit))
+
+        ratio = np.ones(rows.size)
+
+        ratio[rows.size-explicit.size:] = -d22[explicit]/d12[explicit]
+
+        erows = np.concatenate((np.arange(rows.size),np.arange(rows.size-explicit.size,rows.size)))
+        ecols = np.concatenate((rows,2*explicit+1))
+
+        E = csr((np.concatenate((ratio,np.ones(explicit.size))),(erows,ecols)),shape=(rows.size,2*nums))
+
+        keep = np.sort(np.concatenate((2*index,2*index[implicit]+1)))
+
+        delta = np.zeros(2*nums)
+
+        delta[keep] = self.backend(E.dot(J)[:,keep].tocsr(),-E.dot(R))
+
+        delta[2*explicit+1] = (-R[2*explicit]-J.dot(delta)[2*explicit])/d12[explicit]
+
+        return delta
+
+    def system(self,p,Sw,pn,Swn,tstep,faces,implicit=None):
+        """Returns the residual and Jacobian of water and oil equations
+        at (p,Sw), interleaved per grid. Residuals are the inflow minus
+        accumulation in stb/day. If implicit is given, relative
+        permeabilities of the other grids are kept at Swn."""
+        neg,pos,tface = faces
+
+        Vp = self.res.grid_volumes*self.res.porosity
+
+        muw,muo = self.fluids.viscosity[0],self.fluids.viscosity[1]
+        fvfw,fvfo = self.fluids.fvf[0],self.fluids.fvf[1]
+
+        cw = self.res.compressibility+self.fluids.compressibility[0]
+        co = self.res.compressibility+self.fluids.compressibility[1]
+
+        nums = Sw.size
+
+        Skr = Sw if implicit is None else np.where(implicit,Sw,Swn)
+
+        krw,kro,dkrw,dkro = self.relperm(Skr)
+
+        qw,qo,dqw,dqo = self.sources(p,Skr)
+
+        if implicit is not None:
+            dkrw,dkro = np.where(implicit,dkrw,0.),np.where(implicit,dkro,0.)
+            dqw,dqo = (dqw[0],np.where(implicit,dqw[1],0.)),(dqo[0],np.where(implicit,dqo[1],0.))
+
+        side = Mean.upwind(p,neg,pos)
+
+        upwind = np.where(side,pos,neg)
+
+        dp = p[neg]-p[pos]
+
+        # water and oil face transmissibilities and their saturation derivatives
+        Tw = tface*krw[upwind]/(muw*fvfw)*6.33e-3 # unit conversion
+        To = tface*kro[upwind]/(muo*fvfo)*6.33e-3 # unit conversion
+
+        dTw = tface*dkrw[upwind]/(muw*fvfw)*6.33e-3*dp
+        dTo = tface*dkro[upwind]/(muo*fvfo)*6.33e-3*dp
+
+        Aw = Vp*(Sw*(1+cw*(p-pn))-Swn)/(fvfw*tstep)
+        Ao = Vp*((1-Sw)*(1+co*(p-pn))-(1-Swn))/(fvfo*tstep)
+
+        Rw = np.bincount(pos,weights=Tw*dp,minlength=nums)-np.bincount(neg,weights=Tw*dp,minlength=nums)+qw-Aw
+        Ro = np.bincount(pos,weights=To*dp,minlength=nums)-np.bincount(neg,weights=To*dp,minlength=nums)+qo-Ao
+
+        R = np.column_stack((Rw,Ro)).ravel()
+
+        index = np.arange(nums)
+
+        # accumulation and well derivatives on the diagonal blocks
+        rows = [2*index,2*index,2*index+1,2*index+1]
+        cols = [2*index,2*index+1,2*index,2*index+1]
+
+        data = [
+            dqw[0]-Vp*Sw*cw/(fvfw*tstep),
+            dqw[1]-Vp*(1+cw*(p-pn))/(fvfw*tstep),
+            dqo[0]-Vp*(1-Sw)*co/(fvfo*tstep),
+            dqo[1]+Vp*(1+co*(p-pn))/(fvfo*tstep),
+            ]
+
+        # face flux derivatives, the flux leaves neg and enters pos grid
+        for eq,T,dT in ((0,Tw,dTw),(1,To,dTo)):
+            for grid,sign in ((neg,-1.),(pos,1.)):
+                rows += [2*grid+eq]*3
+                cols += [2*neg,2*pos,2*upwind+1]
+                data += [sign*T,-sign*T,sign*dT]
+
+        rows,cols,data = np.concatenate(rows),np.concatenate(cols),np.concatenate(data)
+
+        J = coo_matrix((data,(rows,cols)),shape=(2*nums,2*nums)).tobsr(blocksize=(2,2))
+
+        return R,J
+
+    def relperm(self,Sw,delta=1e-7):
+        """Returns water and oil relative permeabilities and their saturation
+        derivatives; being cell-local, all the grids are perturbed at once."""
+        krw,kro = self.rp.water_oil(Sw=Sw)
+
+        step = np.where(Sw+delta<=1,delta,-delta)
+
+        krw1,kro1 = self.rp.water_oil(Sw=Sw+step)
+
+        return krw,kro,(krw1-krw)/step,(kro1-kro)/step
+
+    def sources(self,p,Sw,delta=(1e-3,1e-7)):
+        """Returns water and oil well rates into the grids and their (p,Sw)
+        derivatives; being cell-local, all the grids are perturbed at once."""
+        qw,qo = self.rates(p,Sw)
+
+        dp = self.rates(p+delta[0],Sw)
+        dS = self.rates(p,Sw+delta[1])
+
+        dqw = ((dp[0]-qw)/delta[0],(dS[0]-qw)/delta[1])
+        dqo = ((dp[1]-qo)/delta[0],(dS[1]-qo)/delta[1])
+
+        return qw,qo,dqw,dqo
+
+    def rates(self,p,Sw):
+        """Returns water and oil well rates into the grids in stb/day, with
+        the well constraints handled as in SimSol.solve."""
+        muw,muo = self.fluids.viscosity[0],self.fluids.viscosity[1]
+        fvfw,fvfo = self.fluids.fvf[0],self.fluids.fvf[1]
+
+        wflow_1phase = ~np.logical_and(self.well_waterflags,self.well_oilflags)
+
+        sp_wf = np.logical_and(self.well_waterflags,wflow_1phase)
+        sp_of = np.logical_and(self.well_oilflags,wflow_1phase)
+
+        cpw = np.logical_and(self.well_bhpflags,self.well_waterflags)
+        cpo = np.logical_and(self.well_bhpflags,self.well_oilflags)
+
+        cqw = np.logical_and(~self.well_bhpflags,self.well_waterflags)
+        cqo = np.logical_and(~self.well_bhpflags,self.well_oilflags)
+
+        grids = self.well_grids
+
+        krw,kro = self.rp.water_oil(Sw=Sw[grids])
+
+        Jw_v = (self.JR*krw)/(muw*fvfw)*6.33e-3 # unit conversion
+        Jn_v = (self.JR*kro)/(muo*fvfo)*6.33e-3 # unit conversion
+
+        qw,qo = np.zeros(grids.size),np.zeros(grids.size)
+
+        qw[cpw] = Jw_v[cpw]*(self.well_limits[cpw]-p[grids[cpw]])
+        qo[cpo] = Jn_v[cpo]*(self.well_limits[cpo]-p[grids[cpo]])
+
+        qw[cqw] = self.well_limits[cqw]*(krw[cqw]*muo)/(krw[cqw]*muo+kro[cqw]*muw)*5.61 # unit conversion
+        qo[cqo] = self.well_limits[cqo]*(kro[cqo]*muw)/(krw[cqo]*muo+kro[cqo]*muw)*5.61 # unit conversion
+
+        qw[sp_wf&cqw] = self.well_limits[sp_wf&cqw]*5.61 # unit conversion
+        qo[sp_of&cqo] = self.well_limits[sp_of&cqo]*5.61 # unit conversion
+
+        qw = np.bincount(grids,weights=qw,minlength=Sw.size)
+        qo = np.bincount(grids,weights=qo,minlength=Sw.size)
+
+        return qw,qo
+
+if __name__ == "__main__":
+
+    pass
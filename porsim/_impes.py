@@ -1,112 +1,420 @@
-from respy.solver._time import Time
+import logging
 
-from respy.solver._block import Block
-from respy.solver._build import Build
+import numpy
 
-from respy.solver._vector import Vector
-from respy.solver._matrix import Matrix
+from scipy.sparse import csr_matrix as csr
+from scipy.sparse import linalg
+from scipy.sparse import diags
+from scipy.sparse import issparse
+
+from ._solver import BaseSolver
+from ._matrix import Matrix
+from ._table import Table
+from ._recorder import Recorder
+from ._checkpoint import Checkpoint
+from ._state import State
 
 class IMPES(BaseSolver):
     """
     The class solves for single phase reservoir flow in Rectangular Cuboids;
 
     """
-    def __init__(self,*args,**kwargs):
+    def __init__(self,grids,rrock,fluid,tcomp=None,backend=None,*,wells=None,edges=None,free=False,active=None):
+        """
+        Initialization of single phase solver.
 
-        super().__init__(*args,**kwargs)
+        wells  : tuple of WellBound instances.
 
-    def set_build(self):
+        edges  : tuple of EdgeBound instances.
 
-        self.build = Build(self.grid)
+        free   : if True, transmissibility is applied matrix-free with
+            the 7-point stencil, best used with a Krylov backend.
 
-    def __call__(self,press=None,tcurr=0,tstep=None):
+        active : boolean mask of the grids the system is built and solved
+            on, or True for the grids of nonzero porosity and permeability;
+            all grids by default. Inactive grids keep their pressure.
+            Multigrid backend needs all the grids, it is not supported.
 
-        env = super().__call__(press,tcurr,tstep)
+        The rest of the inputs are the same as in BaseSolver.
+        """
+        super().__init__(grids,rrock,fluid,tcomp,backend)
 
-        vec = self.block(*env)
+        self.wells = wells
+        self.edges = edges
 
-        mat = self.build(vec)
+        self.free = free
 
-        return mat
+        self.active = active
+
+        self.activate(self.actives() if active is True else active)
+
+        self._colors = None # Jacobian coloring for the numeric Jacobian
+
+        self.niter,self.error,self.converged = 0,None,True # last iteration stats
+
+    def __call__(self,press=None,tstep=1.):
+        """Returns the matrices built at the pressure, press (Pa),
+        and for the time step, tstep (sec)."""
+        if press is not None:
+            self.update(press)
+
+        vec = self.vector(tstep,self.wells,self.edges)
+
+        return self.matrix(vec,self.free)
+
+    def update(self,press):
+        """Updates the pressure dependent properties at press (Pa)."""
+        self.fluid._press = numpy.ravel(press)
+        self.fluid = self.fluid # updates potential and mobility
+
+        if "tcomp" in self._stamps:
+            self.tcomp = None # updates compressibility unless given constant
+
+    def steady(self,*,pref=0.,index=0):
+        """Returns the steady state pressure (Pa) with the wells and edges
+        of the solver, see BaseSolver.steady."""
+        return super().steady(self.wells,self.edges,pref=pref,index=index,free=self.free)
+
+    def solve(self,time,pinit,tstat=False,stepper=None,recorder=None,progress=None,checkpoint=None,restart=None,**kwargs):
+        """Solves the linear system of equation.
+
+        time    : Time instance with the time steps.
+        pinit   : initial pressure in psi.
+        tstat   : if True, the matrices are assumed to be pressure
+                  independent and are built only when the time step
+                  size changes, reusing their LU factors otherwise.
+        stepper : Stepper instance for adaptive time stepping, the time
+                  steps then serve as report times the pressure is
+                  stored at, and the stepper chooses the steps between.
+        recorder: Recorder instance storing the results; by default the
+                  pressures of all time steps are kept in memory. The
+                  recorded pressures are available as _press (nums,steps).
+        progress: callable, progress(index,time,press), called after each
+                  time step with the end time (sec) and pressure (Pa).
+        checkpoint: Checkpoint instance saving the solver state at its
+                  interval of time steps.
+        restart : checkpoint file to continue the same time schedule from,
+                  pinit is then not used. A file-backed recorder keeps its
+                  earlier records, an in-memory one starts at the restart
+                  state.
+
+        """
+        self.recorder = Recorder() if recorder is None else recorder
+
+        states = self.run(time,pinit,tstat,stepper,checkpoint,restart,**kwargs)
+
+        state = next(states) # initial or restart state
+
+        self.recorder.open(time.nums,state.index,press=self.nums,rates=len(self.wells or ())+len(self.edges or ()))
+
+        if self.recorder.count==0: # initial state, or restart state of an empty store
+            self.recorder(state.index,state._time,force=True,press=state._press,rates=lambda: state._rates)
+
+        for state in states:
+
+            self.recorder(state.index,state._time,press=state._press,rates=lambda: state._rates)
+
+            if progress is not None:
+                progress(state.index-1,state._time,state._press.reshape((-1,1)))
+
+        self.recorder.close()
+
+        self._press = self.recorder["press"].T if "press" in self.recorder.fields else None
+
+    def run(self,time,pinit,tstat=False,stepper=None,checkpoint=None,restart=None,**kwargs):
+        """Yields the State of the initial condition, or of the restart
+        step, and after each time step. The states are read-only views,
+        so the history is not kept; the inputs are the same as in solve."""
+        Pn = numpy.zeros((self.nums,1))
+
+        Pn[:,0] = numpy.asarray(pinit)*6894.76
+
+        start,mat,tprev,pmat,terms = 0,None,None,None,None
+
+        if restart is not None:
+            start,Pn,tprev,pmat = self.restore(Checkpoint.load(restart),time,stepper)
+
+        if pmat is not None:
+            mat,terms = self(pmat,tprev),self.terms()
+
+        self.update(Pn) # properties of the initial state
+
+        yield self.state(start,time._times[start],Pn)
+
+        for index,(tcurr,tstep) in enumerate(time):
+
+            if index<start:
+                continue
+
+            if stepper is not None:
+                Pn = self.advance(stepper,tcurr,tcurr+tstep,Pn,tstat,**kwargs)
+            else:
+                if mat is None or tstep!=tprev or self.terms()!=terms or not tstat:
+                    mat,pmat,terms = self(Pn,tstep),Pn,self.terms()
+
+                if not tstat:
+                    mat = self.iterate(mat,Pn,tstep,**kwargs)
+
+                Pn = self.iterator.implicit(mat,Pn,self.backend)
+
+            Pn,tprev = Pn.reshape((-1,1)),tstep
+
+            if checkpoint is not None and checkpoint.due(index+1):
+                self.save(checkpoint,index+1,tcurr+tstep,Pn,tprev,pmat if tstat else None,stepper)
+
+            yield self.state(index+1,tcurr+tstep,Pn)
+
+    def state(self,index,time,press):
+        """Returns the State at the pressure, press (Pa), with the well
+        rates and the last iteration statistics."""
+        return State(index,time,press,rates=self.rates(press),stats=(self.niter,self.error,self.converged))
+
+    def save(self,checkpoint,index,time,press,tstep,pmat=None,stepper=None):
+        """Saves the pressure (Pa) after the time step index at time (sec),
+        the last time step size, the pressure the reused matrices are
+        built at, the stepper and constraint states, and the iteration
+        statistics with the checkpoint."""
+        constrs = tuple(self.wells or ())+tuple(self.edges or ())
+
+        state = dict(press=press,tstep=tstep,
+            conds=numpy.array([constr._cond for constr in constrs],dtype=float),
+            sorts=numpy.array([constr.sort for constr in constrs],dtype=str),
+            stats=numpy.array([self.niter,numpy.nan if self.error is None else self.error,self.converged],dtype=float))
+
+        if pmat is not None:
+            state["pmat"] = pmat
+
+        if stepper is not None:
+            state["stepper"] = numpy.array([stepper._step,stepper.accepts,stepper.rejects],dtype=float)
 
-    def solve(self,**kwargs):
-        """Solves the linear system of equation"""
+        checkpoint.save(index,time,**state)
 
-        Pn = numpy.copy(self._press[:,0])
-        
-        for index,tcurr,tstep in self.time:
+    def restore(self,state,time,stepper=None):
+        """Restores the constraint, stepper and iteration states saved by
+        save, and returns the time step index to continue from, pressure
+        (Pa), last time step size and the pressure of reused matrices."""
+        index = int(state["index"])
 
-            if index==0 or not self.tstat:
-                mat = self(Pn,tcurr,tstep)
+        if not numpy.isclose(time._times[index],float(state["time"])):
+            raise ValueError(f"Checkpoint time {float(state['time'])} sec does not match the time step {index}.")
 
-            if not self.tstat:
-                mat = self.iterate(mat,**kwargs)
+        constrs = tuple(self.wells or ())+tuple(self.edges or ())
 
-            Pn = mat.imppress(Pn)
+        for constr,cond,sort in zip(constrs,state["conds"],state["sorts"]):
+            constr._cond,constr.sort = float(cond),str(sort)
 
-            print(f"{index:10}",Pn.flatten())
-            
-            self._press[:,index+1] = Pn
+        niter,error,converged = state["stats"]
 
-            Pn = Pn.reshape((-1,1))
+        self.niter,self.error,self.converged = int(niter),None if numpy.isnan(error) else float(error),bool(converged)
 
-    def iterate(self,mat:Matrix,jacobian=None,maxiter=100,tol=1e-6):
+        if stepper is not None and "stepper" in state:
+            step,accepts,rejects = state["stepper"]
+            stepper._step,stepper.accepts,stepper.rejects = float(step),int(accepts),int(rejects)
 
-        Pn = numpy.copy(mat._P)
+        return index,state["press"],float(state["tstep"]),state.get("pmat")
 
+    def rates(self,press):
+        """Returns the inflows (m3/sec) of wells and edges, in this order,
+        at the pressure, press (Pa), with the current productivities."""
+        constrs = tuple(self.Wvec(self.wells))+tuple(self.Bvec(self.edges))
+
+        table = Table.stack(constrs,self.indices(self.wells,self.edges))
+
+        return table.rates(numpy.ravel(press))
+
+    def advance(self,stepper,tcurr,tnext,Pn,tstat=False,**kwargs):
+        """Advances the pressure, Pn, from tcurr to tnext (sec) with the
+        adaptive steps of the stepper, retrying the failed steps with a
+        cut step, and returns the pressure at tnext in column."""
+        events,mat,tprev,terms = self.events(),None,None,None
+
+        while tcurr<tnext:
+
+            tend = stepper.target(tcurr,tnext,events)
+
+            tstep = tend-tcurr
+
+            if mat is None or tstep!=tprev or self.terms()!=terms or not tstat:
+                mat,terms = self(Pn,tstep),self.terms()
+
+            if not tstat:
+                mat = self.iterate(mat,Pn,tstep,**kwargs)
+
+            if not tstat and not self.converged:
+                stepper.reject(tstep)
+                mat = None
+                continue
+
+            Pk = self.iterator.implicit(mat,Pn,self.backend).reshape((-1,1))
+
+            stepper.accept(tstep,self.niter if not tstat else 1,numpy.abs(Pk-Pn).max())
+
+            Pn,tcurr,tprev = Pk,tend,tstep
+
+        return Pn
+
+    def events(self):
+        """Returns the start and stop times (sec) of wells and edges."""
+        constrs = tuple(self.wells or ())+tuple(self.edges or ())
+
+        events = [constr._start for constr in constrs]
+        events += [constr._stop for constr in constrs if constr._stop is not None]
+
+        return sorted(set(events))
+
+    def terms(self):
+        """Returns the sorts and values of the well and edge constraints;
+        the matrices reused with tstat are rebuilt when they change."""
+        constrs = tuple(self.wells or ())+tuple(self.edges or ())
+
+        return tuple((constr.sort,constr._cond) for constr in constrs)
+
+    def iterate(self,mat:Matrix,Pn,tstep,jacobian=None,maxiter=100,tol=1e-6):
+        """Iterates the nonlinear implicit system at the time step, tstep,
+        and returns the matrices built at the converged pressure. The
+        number of iterations, last residual norm and convergence are kept
+        in niter, error and converged.
+
+        jacobian: None for Picard iterations, True for Newton iterations
+                  with the analytical sparse Jacobian, "numeric" for
+                  the graph-colored finite-difference Jacobian, "jfnk"
+                  for Jacobian-free Newton-Krylov iterations, or a
+                  callable returning the Jacobian, jacobian(Pk,tstep,tcomp).
+        """
         Pk = numpy.copy(Pn)
 
-        for k in range(maxiter):
+        self.converged = False
+
+        for self.niter in range(1,maxiter+1):
+
+            Rv = self.residual.implicit(mat,Pn,Pk)
 
-            Rv = mat.impresid(Pn)
+            self.error = numpy.linalg.norm(Rv,2)
+
+            if not numpy.isfinite(self.error):
+                break
 
             if jacobian is None:
-                Pk = mat.imppress(Pn)
-            elif jacobian is True:
-                Jm = self.jacobian(Pk,tcurr,tstep,Pn)
-                Pk = Pk+np.linalg.solve(Jm,-Rv)
+                Pk = self.iterator.implicit(mat,Pn,self.backend).reshape((-1,1))
+            elif jacobian=="jfnk":
+                Pk = Pk+self.jfnk(mat,Pk,tstep,Pn,Rv).reshape((-1,1))
             else:
-                Jm = jacobian(Pk,tstep,tcomp)
-                Pk = Pk+np.linalg.solve(Jm,-Rv)
-                
-            error = np.linalg.norm(Rv,2)
+                if jacobian is True:
+                    Jm = self.jacobian(mat,Pk,tstep,Pn)
+                elif jacobian=="numeric":
+                    Jm = self.numeric(mat,Pk,tstep,Pn)
+                else:
+                    Jm = mat.restrict(csr(jacobian(Pk,tstep,self._tcomp)))
 
-            print(f"{k:2}",f"{error:.5e}",Pk.flatten())
+                delta = self.iterator.solve(mat,("jacobian",),lambda: -Jm,mat.gather(Rv),None,self.backend)
 
-            if np.linalg.norm(Rv,2)<tol:
-                break
+                Pk = Pk+mat.scatter(delta).reshape((-1,1))
 
-            mat = self(Pk,tcurr,tstep)
+            logging.debug(f"Iteration {self.niter-1:2}, residual norm {self.error:.5e}")
 
-        else:
+            if self.error<tol:
+                self.converged = True
+                break
+
+            mat = self(Pk,tstep)
 
-            print(f"It could not converge after {maxiter} iterations.")
+        if not self.converged:
+            logging.warning(f"It could not converge after {self.niter} iterations, residual norm is {self.error:.3e}.")
 
         return mat
 
-    def jacobian(self,press,tcurr,tstep,pprev,delta=10):
+    def jacobian(self,mat:Matrix,press,tstep,pprev,delta=10.):
+        """Returns the sparse Jacobian of the implicit residual, dR/dP, at
+        the pressure, press (Pa), the matrices, mat, are built at. It adds
+        to -(T+J+A) the upwind mobility derivatives of the face fluxes, and
+        the derivatives of accumulation and pressure constraint inflows on
+        the diagonal; rate allocation among the well grids is lagged.
+
+        pprev   : pressure at the previous time step (Pa).
+        delta   : pressure perturbation (Pa) for the cell-local derivatives
+                  of the fluid properties.
+        """
+        press,pprev = numpy.ravel(press),numpy.ravel(pprev)
+
+        dmobil,dtcomp = self.derivative(delta)
+
+        table = self.table(self.vector(tstep,self.wells,self.edges))
+
+        ratio = numpy.divide(dmobil,self._mobil,out=numpy.zeros(self.nums),where=self._mobil!=0)
+
+        daccum = (self._volume*self.rrock._poro)/tstep*dtcomp*(pprev-press)
+
+        T = mat._T if issparse(mat._T) else mat._T.tocsr()
+
+        faces,sides = self.Dvec(dmobil)
+
+        if mat._cells is None:
+            D = self.Dmat(faces,sides)
+        else: # only the faces between active grids, as in compressed T
+            pattern,keeps,_ = self.apattern
+            D = pattern.dmatrix(*(pattern.faces(*(value[keep] for value,keep in zip(values,keeps))) for values in (faces,sides)))
+
+        return D+mat.restrict(diags(daccum+table.dvalues(press,ratio)))-(T+mat._J+mat._A)
+
+    def numeric(self,mat:Matrix,press,tstep,pprev,delta=10.):
+        """Returns the finite-difference Jacobian of the implicit residual
+        in CSR format, for property models without derivatives. The grids
+        are perturbed per color of the distance-2 coloring, so it takes
+        (number of colors + 1) residual evaluations, about 8 in 3D.
+
+        pprev   : pressure at the previous time step (Pa).
+        delta   : pressure perturbation (Pa).
+        """
+        if self._colors is None:
+            self._colors = self.coloring(self.wells,self.edges)
+
+        press = numpy.reshape(press,(-1,1))
+
+        resid = lambda P: self.residual.implicit(self(P,tstep),pprev,P.reshape((-1,1)))
+
+        jacobian = self._colors.jacobian(resid,press,delta,self.residual.implicit(mat,pprev,press))
+
+        self.update(press) # restores the properties at press
+
+        return mat.restrict(jacobian)
+
+    def jfnk(self,mat:Matrix,press,tstep,pprev,resid,rtol=1e-4,maxiter=50):
+        """Returns the Newton update at the pressure, press (Pa), solving
+        with GMRES where the Jacobian-vector products are the directional
+        finite differences of the implicit residual, so no Jacobian is
+        formed. It is preconditioned by the inverse of -(T+J+A), which is
+        factorized once per matrix set as for the Picard iterations.
 
-        mat0 = self(press,tcurr,tstep)
+        pprev   : pressure at the previous time step (Pa).
+        resid   : implicit residual at press.
+        rtol    : relative tolerance of the linear iterations.
+        maxiter : maximum number of GMRES iterations.
+        """
+        press,resid = numpy.ravel(press),mat.gather(numpy.ravel(resid))
 
-        resid0 = mat.impresid(pprev)
+        scale = numpy.sqrt(numpy.finfo(float).eps)*(1+numpy.linalg.norm(press))
 
-        press1 = numpy.zeros(press.shape)
-        press2 = numpy.zeros(press.shape)
+        def matvec(vector):
+            vector = numpy.ravel(vector)
+            vnorm = numpy.linalg.norm(vector)
+            if vnorm==0:
+                return numpy.zeros(resid.size)
+            delta = scale/vnorm
+            P = (press+delta*mat.scatter(vector)).reshape((-1,1))
+            return (mat.gather(numpy.ravel(self.residual.implicit(self(P,tstep),pprev,P)))-resid)/delta
 
-        press1[0::2] = press[0::2]+delta
-        press2[1::2] = press[1::2]+delta
+        LHS = lambda: mat._T+mat._J+mat._A
 
-        mat1 = self(press1,tcurr,tstep)
-        mat2 = self(press2,tcurr,tstep)
+        precond = lambda x: -self.iterator.solve(mat,("implicit",),LHS,x,None,self.backend)
 
-        resid1 = mat1.impresid(pprev)
-        resid2 = mat2.impresid(pprev)
+        shape = (resid.size,resid.size)
 
-        vector = numpy.zeros(press.shape)
+        update,info = linalg.gmres(linalg.LinearOperator(shape,matvec=matvec),-resid,
+            rtol=rtol,maxiter=maxiter,M=linalg.LinearOperator(shape,matvec=precond))
 
-        vector[0::2] = (resid1-resid0)/delta
-        vector[1::2] = (resid2-resid0)/delta
+        self.update(press) # restores the properties at press
 
-        return self.build.get_diag(vector)
+        if info>0:
+            logging.warning(f"gmres did not converge in {maxiter} iterations of the Newton update.")
 
-    
+        return mat.scatter(update)
@@ -1,3 +1,5 @@
+import numpy
+
 class Matrix():
 
     def __init__(self,A,T,G,J,Q):
@@ -25,7 +27,51 @@ class Matrix():
         self._G = G
         self._J = J
         self._Q = Q
+
+        self._cache = {} # factorizations of the system matrices built from A, T and J
+
+        self._cells,self._nums = None,None # active grid indices and number of all grids
+
+    def gather(self,vector):
+        """Returns the rows of active grids from the full grid vector."""
+        return vector if self._cells is None else numpy.asarray(vector)[self._cells]
+
+    def scatter(self,values,fill=0.):
+        """Returns the values of active grids placed in the full grid
+        vector, the inactive grids take fill, a scalar or full vector."""
+        if self._cells is None:
+            return values
+
+        values,fill = numpy.asarray(values),numpy.asarray(fill,dtype=float)
+
+        if fill.ndim>0:
+            fill = fill.ravel() if values.ndim==1 else fill.reshape((self._nums,-1))
+
+        full = numpy.empty((self._nums,)+values.shape[1:])
+
+        full[...] = fill
+
+        full[self._cells] = values
+
+        return full
+
+    def restrict(self,matrix):
+        """Returns the rows and columns of active grids of the full grid
+        sparse matrix."""
+        return matrix if self._cells is None else matrix.tocsr()[self._cells][:,self._cells]
     
+    def batch(self,Q=None,G=None):
+        """Returns the matrices with (N,k) blocks of source and gravity
+        columns for k scenarios. A, T and J, and the cache of their
+        factorizations, are shared, so the scenarios are solved together."""
+        batch = Matrix(self._A,self._T,self._G if G is None else G,self._J,self._Q if Q is None else Q)
+
+        batch._cache = self._cache
+
+        batch._cells,batch._nums = self._cells,self._nums
+
+        return batch
+
     @property
     def A(self):
         return self._A*(3.28084**3)*(24*60*60)*6894.76
@@ -0,0 +1,174 @@
+import logging
+
+import numpy
+
+from scipy.sparse import csr_matrix as csr
+from scipy.sparse import diags
+from scipy.sparse import linalg
+
+from ._backend import Backend
+
+class Level:
+    """Single level of the multigrid hierarchy."""
+
+    def __init__(self,shape,LHS):
+        """
+        shape   : number of grids in x, y and z directions
+        LHS     : level matrix in CSR format
+        """
+        self.shape = shape
+        self.LHS = LHS
+
+        self.inverse = 1/LHS.diagonal()
+
+        self.P = None # prolongation to this level from the coarser one
+        self.R = None # restriction from this level to the coarser one
+
+        self.solve = None # direct solver on the coarsest level
+
+class Multigrid(Backend):
+    """Geometric multigrid for the pressure equation on structured cuboid
+    grids. Cells are aggregated by a factor of 2 per axis, and the piecewise
+    constant aggregation is smoothed with the level matrix, so prolongation
+    and restriction follow the transmissibility field. Coarse matrices are
+    Galerkin products, R A P with R = P^T."""
+
+    def __init__(self,shape:tuple,*,smooth:int=2,omega:float=2/3,coarsest:int=500,rtol:float=1e-8,maxiter:int=100):
+        """
+        Initialization of geometric multigrid.
+
+        shape   : number of grids in x, y and z directions, e.g.,
+                  solver.shape, with the x-index changing fastest.
+
+        smooth  : number of damped Jacobi sweeps before and after
+                  the coarse grid correction.
+
+        omega   : Jacobi damping factor, used both in smoothing and in
+                  the prolongation; the default 2/3 keeps the damped
+                  Jacobi stable as long as the diagonal dominates.
+
+        coarsest: number of grids below which the coarsening stops
+                  and the level is solved directly.
+
+        rtol    : relative tolerance of the residual norm when the
+                  multigrid is used as a solver.
+
+        maxiter : maximum number of V-cycles when used as a solver.
+
+        """
+        self.shape = tuple(int(n) for n in shape)
+
+        self.smooth = smooth
+        self.omega = omega
+        self.coarsest = coarsest
+
+        self.rtol = rtol
+        self.maxiter = maxiter
+
+        super().__init__()
+
+    def __call__(self,LHS,RHS,x0=None,cache=None):
+        """Returns the solution of LHS x = RHS iterating with V-cycles.
+
+        LHS     : sparse matrix, or callable returning it
+        RHS     : right hand side vector, or (N,k) block of columns
+        x0      : initial guess for warm-starting
+        cache   : dictionary dedicated to the LHS matrix for storing
+                  the multigrid hierarchy between the calls
+        """
+        cache = {} if cache is None else cache
+
+        if numpy.ndim(RHS)==2:
+            return self.columns(LHS,RHS,x0,cache)
+
+        if "levels" not in cache:
+            cache["LHS"] = LHS() if callable(LHS) else LHS
+            cache["levels"] = self.hierarchy(cache["LHS"])
+
+        x = numpy.zeros(RHS.size) if x0 is None else numpy.array(x0,dtype=float).ravel()
+
+        for self.niter in range(self.maxiter+1):
+
+            self.error = self.residual(cache["LHS"],RHS,x)
+
+            if self.error<self.rtol or self.niter==self.maxiter:
+                break
+
+            x += self.cycle(cache["levels"],RHS-cache["LHS"].dot(x))
+
+        if self.error>=self.rtol:
+            logging.warning(f"Multigrid did not converge in {self.niter} iterations, relative residual is {self.error:.3e}.")
+
+        return x
+
+    def operator(self,LHS):
+        """Returns a single V-cycle as a LinearOperator to be used as
+        the preconditioner, e.g., Krylov("cg",precond=mg.operator)."""
+        levels = self.hierarchy(LHS)
+
+        return linalg.LinearOperator(LHS.shape,matvec=lambda x: self.cycle(levels,numpy.ravel(x)))
+
+    def hierarchy(self,LHS):
+        """Returns the list of levels from the finest to the coarsest."""
+        if LHS.shape[0]!=numpy.prod(self.shape):
+            raise ValueError(f"Multigrid is built on all the {numpy.prod(self.shape)} grids of shape {self.shape}, "
+                f"it cannot be used with the {LHS.shape[0]} active grids.")
+
+        levels = [Level(self.shape,LHS.tocsr())]
+
+        while numpy.prod(levels[-1].shape)>self.coarsest and max(levels[-1].shape)>1:
+
+            fine = levels[-1]
+
+            P0,shape = self.aggregate(fine.shape)
+
+            fine.P = P0-self.omega*diags(fine.inverse).dot(fine.LHS.dot(P0))
+            fine.R = fine.P.T.tocsr()
+
+            levels.append(Level(shape,(fine.R.dot(fine.LHS.dot(fine.P))).tocsr()))
+
+        levels[-1].solve = linalg.factorized(levels[-1].LHS.tocsc())
+
+        return levels
+
+    @staticmethod
+    def aggregate(shape):
+        """Returns piecewise constant prolongation of 2x2x2 aggregates
+        and the coarse grid shape."""
+        coarse = tuple((n+1)//2 for n in shape)
+
+        index = numpy.arange(numpy.prod(shape))
+
+        xindex = index%shape[0]
+        yindex = (index//shape[0])%shape[1]
+        zindex = index//(shape[0]*shape[1])
+
+        aggregate = xindex//2+coarse[0]*(yindex//2+coarse[1]*(zindex//2))
+
+        P0 = csr((numpy.ones(index.size),(index,aggregate)),shape=(index.size,numpy.prod(coarse)))
+
+        return P0,coarse
+
+    def cycle(self,levels,RHS,level=0):
+        """Returns the V-cycle approximation of the solution of the
+        level matrix starting from zero initial guess."""
+        this = levels[level]
+
+        if this.solve is not None:
+            return this.solve(RHS)
+
+        x = numpy.zeros(RHS.size)
+
+        for _ in range(self.smooth):
+            x += self.omega*this.inverse*(RHS-this.LHS.dot(x))
+
+        x += this.P.dot(self.cycle(levels,this.R.dot(RHS-this.LHS.dot(x)),level+1))
+
+        for _ in range(self.smooth):
+            x += self.omega*this.inverse*(RHS-this.LHS.dot(x))
+
+        return x
+
+if __name__ == "__main__":
+
+    pass
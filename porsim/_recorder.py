@@ -0,0 +1,98 @@
+import numpy
+
+from numpy.lib.format import open_memmap
+
+class Recorder:
+    """Bounded-memory storage of time step results. Snapshots are written
+    row by row, in memory or to memory-mapped .npy files, so the solver
+    keeps only the current and previous states."""
+
+    def __init__(self,path=None,fields=("press",),every:int=1,dtype=numpy.float64):
+        """
+        path    : file prefix of the stores, {path}_{field}.npy and
+                  {path}_times.npy; results are kept in memory if None.
+
+        fields  : recorded fields, "press" for grid pressures (Pa) and
+                  "rates" for inflows of wells and edges (m3/sec).
+
+        every   : output frequency in time steps; the initial and the
+                  last states are always recorded.
+
+        dtype   : storage type of fields, e.g., numpy.float32 halves
+                  the size; times are always stored in float64.
+        """
+        self.path = path
+        self.fields = tuple(fields)
+
+        self.every = every
+        self.dtype = dtype
+
+        self.stores,self.steps,self.count = {},0,0
+
+    def open(self,steps:int,start:int=0,**sizes):
+        """Allocates the stores for the number of time steps, steps, where
+        sizes are the lengths of the field vectors, e.g., press=nums. When
+        restarting after the time step start, the existing file stores
+        are reopened and recording continues after its records; in-memory
+        stores start empty."""
+        rows = len(range(0,steps+1,self.every))+int(steps%self.every!=0)
+
+        resume = start>0 and self.path is not None
+
+        self.steps,self.count = steps,len(range(0,start+1,self.every)) if resume else 0
+
+        mode = "r+" if resume else "w+"
+
+        self.stores = {"times":self.allocate("times",(rows,),numpy.float64,mode)}
+
+        for field in self.fields:
+            self.stores[field] = self.allocate(field,(rows,sizes[field]),self.dtype,mode)
+
+    def allocate(self,field:str,shape:tuple,dtype,mode:str="w+"):
+        """Returns the zero-filled store of the field, or the existing file
+        store in "r+" mode."""
+        if self.path is None:
+            return numpy.zeros(shape,dtype=dtype)
+
+        if mode=="r+":
+            return open_memmap(f"{self.path}_{field}.npy",mode=mode)
+
+        return open_memmap(f"{self.path}_{field}.npy",mode=mode,dtype=dtype,shape=shape)
+
+    def due(self,index:int):
+        """Returns True if the time step index is to be recorded."""
+        return index%self.every==0 or index==self.steps
+
+    def __call__(self,index:int,time:float,force:bool=False,**values):
+        """Records the values at the time step index and time (sec) if it
+        is due or force is True. Values can be callables, evaluated only
+        when recorded."""
+        if not (force or self.due(index)):
+            return
+
+        self.stores["times"][self.count] = time
+
+        for field in self.fields:
+            value = values[field]() if callable(values[field]) else values[field]
+            self.stores[field][self.count] = numpy.ravel(value)
+
+        self.count += 1
+
+    def close(self):
+        """Flushes the memory-mapped stores to disk."""
+        for store in self.stores.values():
+            if isinstance(store,numpy.memmap):
+                store.flush()
+
+    def __getitem__(self,field:str):
+        """Returns the recorded snapshots of the field, one row per record."""
+        return self.stores[field][:self.count]
+
+    @staticmethod
+    def load(path:str,field:str):
+        """Returns the read-only memory-mapped store of the field."""
+        return numpy.load(f"{path}_{field}.npy",mmap_mode="r")
+
+if __name__ == "__main__":
+
+    pass
@@ -1,6 +1,6 @@
-import matplotlib.pyplot as plt
+import logging
 
-import numpy
+import numpy as np
 
 from scipy.sparse import linalg
 
@@ -8,6 +8,9 @@ from scipy.sparse import identity
 from scipy.sparse import diags
 from scipy.sparse import csr_matrix as csr
 
+from ._backend import Direct
+from ._checkpoint import Checkpoint
+
 # from ._relperm import RelPerm
 
 # from ._cappres import BrooksCorey
@@ -41,21 +44,44 @@ Benchmark:
 class SimSol():
     """Simultanous Solution"""
 
-    def __init__(self,res,fluids,relperm,wells):
-
-        self.PorRock = PorRock("rectangle")()
+    def __init__(self,res,fluids,relperm,wells,backend=None):
+        """
+        res     : reservoir with the grid indices, volumes, porosity and
+                  rock compressibility.
+        fluids  : water and oil viscosity, fvf and compressibility. There
+                  can be two slightly compressible fluids where the second
+                  one is at irreducible saturation, not mobile.
+        relperm : relative permeability model with water_oil(Sw).
+        wells   : wells with the item names.
+        backend : linear solver, Direct() by default.
+
+        The face transmissibilities (TXP,TYP,TZP), well arrays (well_grids,
+        well_waterflags, well_oilflags, well_bhpflags, well_limits, JR),
+        time schedule (time_array, time_step) and the pressure and Sw
+        arrays with the initial values in the first column are set as
+        attributes before solving.
+        """
+        self.res = res
+        self.fluids = fluids
 
-        # There can be two slightly compressible fluids where the
-        # second one is at irreducible saturation, not mobile
+        self.rp = relperm
 
-        self.Fluids = Fluids(number=2)
+        self.wells = wells
 
-        self.Wells = Wells()
+        self.backend = Direct() if backend is None else backend
 
-        self.rp = relperm
-
-    def solve(self):
+    def solve(self,substeps=False,cfl=1.,checkpoint=None,restart=None):
+        """Solves pressure implicitly and saturation explicitly.
 
+        substeps: if True, saturation is advanced with several CFL-sized
+                  sub-steps per pressure solve, reusing the frozen total
+                  fluxes, so the time step is not limited by the explicit
+                  saturation stability.
+        cfl     : CFL number of the saturation sub-steps.
+        checkpoint: Checkpoint instance saving the state at its interval
+                  of time steps.
+        restart : checkpoint file to continue from.
+        """
         Vp = self.res.grid_volumes*self.res.porosity
 
         muw = self.fluids.viscosity[0]
@@ -80,48 +106,21 @@ class SimSol():
         cqw = np.logical_and(~self.well_bhpflags,self.well_waterflags)
         cqo = np.logical_and(~self.well_bhpflags,self.well_oilflags)
 
-        cxm_0 = self.res.grid_indices[self.res.grid_hasxmin,0]
-        cxm_m = self.res.grid_indices[self.res.grid_hasxmin,1]
-
-        cxp_0 = self.res.grid_indices[self.res.grid_hasxmax,0]
-        cxp_p = self.res.grid_indices[self.res.grid_hasxmax,2]
-
-        cym_0 = self.res.grid_indices[self.res.grid_hasymin,0]
-        cym_m = self.res.grid_indices[self.res.grid_hasymin,3]
-
-        cyp_0 = self.res.grid_indices[self.res.grid_hasymax,0]
-        cyp_p = self.res.grid_indices[self.res.grid_hasymax,4]
-
-        czm_0 = self.res.grid_indices[self.res.grid_haszmin,0]
-        czm_m = self.res.grid_indices[self.res.grid_haszmin,5]
-
-        czp_0 = self.res.grid_indices[self.res.grid_haszmax,0]
-        czp_p = self.res.grid_indices[self.res.grid_haszmax,6]
-
         mshape = (self.res.grid_numtot,self.res.grid_numtot)
         vshape = (self.res.grid_numtot,1)
 
         vzeros = np.zeros(len(self.wells.itemnames),dtype=int)
 
-        krw,kro = self.rp.water_oil(Sw=self.Sw[:,0])
+        neg,pos,tface = self.faces()
 
-        krw_xm = krw[cxm_0]
-        krw_xp = krw[cxp_0]
-        krw_ym = krw[cym_0]
-        krw_yp = krw[cyp_0]
-        krw_zm = krw[czm_0]
-        krw_zp = krw[czp_0]
-
-        kro_xm = kro[cxm_0]
-        kro_xp = kro[cxp_0]
-        kro_ym = kro[cym_0]
-        kro_yp = kro[cyp_0]
-        kro_zm = kro[czm_0]
-        kro_zp = kro[czp_0]
+        start = 0 if restart is None else self.restore(Checkpoint.load(restart))
 
         for index,time in enumerate(self.time_array):
 
-            print("@{:5.1f}th time step".format(time))
+            if index<start:
+                continue
+
+            logging.info("@{:5.1f}th time step".format(time))
 
             d11 = (Vp*self.Sw[:,index])/(self.time_step*fvfw)*(cr+cw)
             d12 = (Vp)/(self.time_step*fvfw)
@@ -130,98 +129,15 @@ class SimSol():
 
             self.D = diags(-d22/d12*d11+d21)
 
-            Uxm = self.pressure[:,index][cxm_0]>self.pressure[:,index][cxm_m]
-            Uxp = self.pressure[:,index][cxp_0]>self.pressure[:,index][cxp_p]
-            Uym = self.pressure[:,index][cym_0]>self.pressure[:,index][cym_m]
-            Uyp = self.pressure[:,index][cyp_0]>self.pressure[:,index][cyp_p]
-            Uzm = self.pressure[:,index][czm_0]>self.pressure[:,index][czm_m]
-            Uzp = self.pressure[:,index][czp_0]>self.pressure[:,index][czp_p]
+            upwind = np.where(self.pressure[:,index][neg]>self.pressure[:,index][pos],neg,pos)
 
             krw,kro = self.rp.water_oil(Sw=self.Sw[:,index])
 
-            krw_xm[Uxm] = krw[cxm_0][Uxm]
-            krw_xp[Uxp] = krw[cxp_0][Uxp]
-            krw_ym[Uym] = krw[cym_0][Uym]
-            krw_yp[Uyp] = krw[cyp_0][Uyp]
-            krw_zm[Uzm] = krw[czm_0][Uzm]
-            krw_zp[Uzp] = krw[czp_0][Uzp]
-
-            krw_xm[~Uxm] = krw[cxm_m][~Uxm]
-            krw_xp[~Uxp] = krw[cxp_p][~Uxp]
-            krw_ym[~Uym] = krw[cym_m][~Uym]
-            krw_yp[~Uyp] = krw[cyp_p][~Uyp]
-            krw_zm[~Uzm] = krw[czm_m][~Uzm]
-            krw_zp[~Uzp] = krw[czp_p][~Uzp]
-
-            kro_xm[Uxm] = kro[cxm_0][Uxm]
-            kro_xp[Uxp] = kro[cxp_0][Uxp]
-            kro_ym[Uym] = kro[cym_0][Uym]
-            kro_yp[Uyp] = kro[cyp_0][Uyp]
-            kro_zm[Uzm] = kro[czm_0][Uzm]
-            kro_zp[Uzp] = kro[czp_0][Uzp]
-
-            kro_xm[~Uxm] = kro[cxm_m][~Uxm]
-            kro_xp[~Uxp] = kro[cxp_p][~Uxp]
-            kro_ym[~Uym] = kro[cym_m][~Uym]
-            kro_yp[~Uyp] = kro[cyp_p][~Uyp]
-            kro_zm[~Uzm] = kro[czm_m][~Uzm]
-            kro_zp[~Uzp] = kro[czp_p][~Uzp]
-
-            TXMw = (self.TXM[self.res.grid_hasxmin]*krw_xm)/(muw*fvfw)*6.33e-3 # unit conversion
-            TYMw = (self.TYM[self.res.grid_hasymin]*krw_ym)/(muw*fvfw)*6.33e-3 # unit conversion
-            TZMw = (self.TZM[self.res.grid_haszmin]*krw_zm)/(muw*fvfw)*6.33e-3 # unit conversion
-
-            TXPw = (self.TXP[self.res.grid_hasxmax]*krw_xp)/(muw*fvfw)*6.33e-3 # unit conversion
-            TYPw = (self.TYP[self.res.grid_hasymax]*krw_yp)/(muw*fvfw)*6.33e-3 # unit conversion
-            TZPw = (self.TZP[self.res.grid_haszmax]*krw_zp)/(muw*fvfw)*6.33e-3 # unit conversion
-
-            TXMn = (self.TXM[self.res.grid_hasxmin]*kro_xm)/(muo*fvfo)*6.33e-3 # unit conversion
-            TYMn = (self.TYM[self.res.grid_hasymin]*kro_ym)/(muo*fvfo)*6.33e-3 # unit conversion
-            TZMn = (self.TZM[self.res.grid_haszmin]*kro_zm)/(muo*fvfo)*6.33e-3 # unit conversion
-
-            TXPn = (self.TXP[self.res.grid_hasxmax]*kro_xp)/(muo*fvfo)*6.33e-3 # unit conversion
-            TYPn = (self.TYP[self.res.grid_hasymax]*kro_yp)/(muo*fvfo)*6.33e-3 # unit conversion
-            TZPn = (self.TZP[self.res.grid_haszmax]*kro_zp)/(muo*fvfo)*6.33e-3 # unit conversion
+            tfacew = (tface*krw[upwind])/(muw*fvfw)*6.33e-3 # unit conversion
+            tfacen = (tface*kro[upwind])/(muo*fvfo)*6.33e-3 # unit conversion
 
-            self.Tw = csr(mshape)
-
-            self.Tw -= csr((TXMw,(cxm_0,cxm_m)),shape=mshape)
-            self.Tw += csr((TXMw,(cxm_0,cxm_0)),shape=mshape)
-
-            self.Tw -= csr((TXPw,(cxp_0,cxp_p)),shape=mshape)
-            self.Tw += csr((TXPw,(cxp_0,cxp_0)),shape=mshape)
-
-            self.Tw -= csr((TYMw,(cym_0,cym_m)),shape=mshape)
-            self.Tw += csr((TYMw,(cym_0,cym_0)),shape=mshape)
-
-            self.Tw -= csr((TYPw,(cyp_0,cyp_p)),shape=mshape)
-            self.Tw += csr((TYPw,(cyp_0,cyp_0)),shape=mshape)
-
-            self.Tw -= csr((TZMw,(czm_0,czm_m)),shape=mshape)
-            self.Tw += csr((TZMw,(czm_0,czm_0)),shape=mshape)
-
-            self.Tw -= csr((TZPw,(czp_0,czp_p)),shape=mshape)
-            self.Tw += csr((TZPw,(czp_0,czp_0)),shape=mshape)
-
-            self.Tn = csr(mshape)
-
-            self.Tn -= csr((TXMn,(cxm_0,cxm_m)),shape=mshape)
-            self.Tn += csr((TXMn,(cxm_0,cxm_0)),shape=mshape)
-
-            self.Tn -= csr((TXPn,(cxp_0,cxp_p)),shape=mshape)
-            self.Tn += csr((TXPn,(cxp_0,cxp_0)),shape=mshape)
-
-            self.Tn -= csr((TYMn,(cym_0,cym_m)),shape=mshape)
-            self.Tn += csr((TYMn,(cym_0,cym_0)),shape=mshape)
-
-            self.Tn -= csr((TYPn,(cyp_0,cyp_p)),shape=mshape)
-            self.Tn += csr((TYPn,(cyp_0,cyp_0)),shape=mshape)
-
-            self.Tn -= csr((TZMn,(czm_0,czm_m)),shape=mshape)
-            self.Tn += csr((TZMn,(czm_0,czm_0)),shape=mshape)
-
-            self.Tn -= csr((TZPn,(czp_0,czp_p)),shape=mshape)
-            self.Tn += csr((TZPn,(czp_0,czp_0)),shape=mshape)
+            self.Tw = self.tmatrix(tfacew,neg,pos,mshape)
+            self.Tn = self.tmatrix(tfacen,neg,pos,mshape)
 
             self.T = diags(-d22/d12)*self.Tw+self.Tn
 
@@ -258,94 +174,259 @@ class SimSol():
 
             self.Q = -d22/d12*self.Qw+self.Qn
 
-            self.pressure[:,index+1] = sps(self.T+self.J+self.D,self.D.dot(self.pressure[:,index])+self.Q)
+            self.pressure[:,index+1] = self.backend(self.T+self.J+self.D,
+                self.D.dot(self.pressure[:,index])+self.Q,x0=self.pressure[:,index])
 
             delta_p = (self.pressure[:,index+1]-self.pressure[:,index])
-            
-            tjp = csr.dot(self.Tw+self.Jw,self.pressure[:,index+1])
 
-            self.Sw[:,index+1] = self.Sw[:,index]-(d11*delta_p-self.Qw+tjp)/d12
+            if substeps:
+
+                pnew = self.pressure[:,index+1]
+
+                flux = (fvfw*tfacew+fvfo*tfacen)*(pnew[neg]-pnew[pos])
+
+                qw = fvfw*(self.Qw-self.Jw.dot(pnew))
+                qt = qw+fvfo*(self.Qn-self.Jn.dot(pnew))
+
+                self.Sw[:,index+1] = self.transport(self.Sw[:,index],Vp,self.time_step,
+                    (neg,pos,flux),(qw,qt),(cr+cw)*delta_p,cfl)
+
+            else:
+
+                tjp = csr.dot(self.Tw+self.Jw,self.pressure[:,index+1])
+
+                self.Sw[:,index+1] = self.Sw[:,index]-(d11*delta_p-self.Qw+tjp)/d12
+
+            if checkpoint is not None and checkpoint.due(index+1):
+                self.save(checkpoint,index+1)
 
         for index,(p,sw) in enumerate(zip(self.pressure[:,-1],self.Sw[:,-1])):
-            print("{:d}\tP\t{:4.1f}\tSw\t{:.5f}".format(index,p,sw))
+            logging.debug("{:d}\tP\t{:4.1f}\tSw\t{:.5f}".format(index,p,sw))
+
+    def save(self,checkpoint,index):
+        """Saves pressure and saturation after the time step index."""
+        checkpoint.save(index,self.time_array[index-1]+self.time_step,
+            pressure=self.pressure[:,index],Sw=self.Sw[:,index])
+
+    def restore(self,state):
+        """Restores pressure and saturation saved by save, and returns
+        the time step index to continue from. The checkpoint must be of
+        the same time schedule and number of grids."""
+        index = int(state["index"])
+
+        if not 0<index<=self.time_array.size:
+            raise ValueError(f"Checkpoint time step {index} is out of the {self.time_array.size} time steps.")
 
-def newton_solver(grid,timestep,timesteps,T,J,Q):
+        if not np.isclose(self.time_array[index-1]+self.time_step,float(state["time"])):
+            raise ValueError(f"Checkpoint time {float(state['time'])} does not match the time step {index}.")
 
-    array = np.zeros((grid.numtot,timesteps))
+        for key in ("pressure","Sw"):
+            if np.shape(state[key])!=(self.pressure.shape[0],):
+                raise ValueError(f"Checkpoint {key} has shape {np.shape(state[key])}, expected ({self.pressure.shape[0]},).")
 
-    P = grid.pressure_initial
+        self.pressure[:,index],self.Sw[:,index] = state["pressure"],state["Sw"]
+
+        return index
+
+    def faces(self):
+        """Returns the face list: negative and positive side grids of each
+        face, listed once, and the face geometric transmissibility."""
+        cxp_0 = self.res.grid_indices[self.res.grid_hasxmax,0]
+        cxp_p = self.res.grid_indices[self.res.grid_hasxmax,2]
+
+        cyp_0 = self.res.grid_indices[self.res.grid_hasymax,0]
+        cyp_p = self.res.grid_indices[self.res.grid_hasymax,4]
+
+        czp_0 = self.res.grid_indices[self.res.grid_haszmax,0]
+        czp_p = self.res.grid_indices[self.res.grid_haszmax,6]
+
+        neg = np.concatenate((cxp_0,cyp_0,czp_0))
+        pos = np.concatenate((cxp_p,cyp_p,czp_p))
+
+        tface = np.concatenate((self.TXP[self.res.grid_hasxmax],
+            self.TYP[self.res.grid_hasymax],self.TZP[self.res.grid_haszmax]))
+
+        return neg,pos,tface
+
+    def transport(self,Sw,Vp,tstep,faces,wells,expand,cfl=1.):
+        """Returns water saturation advanced over the time step explicitly
+        with CFL-sized sub-steps, keeping the total fluxes frozen and
+        updating the water fractional flow at every sub-step.
+
+        Sw      : water saturation at the beginning of the time step
+        Vp      : pore volume of the grids
+        faces   : tuple of (neg,pos,flux) face arrays, flux is the total
+                  reservoir rate from the neg to the pos grid; the water
+                  is upwinded by the sign of the frozen flux
+        wells   : tuple of (water,total) reservoir rates into the grids,
+                  injected water is kept, produced water follows fw
+        expand  : saturation change due to compressibility, Sw*expand
+        """
+        neg,pos,flux = faces
+
+        upwind = np.where(flux>=0,neg,pos)
+
+        qw,qt = wells
+
+        fwmax = self.fractional(np.linspace(0,1,201))
+
+        fwmax = np.max(np.abs(np.diff(fwmax)))*200
+
+        rate = self.throughput(flux,neg,pos,Vp.size,qt)
+
+        limit = np.min(Vp[rate>0]/rate[rate>0])/max(fwmax,1e-12) if np.any(rate>0) else tstep
+
+        nums = max(int(np.ceil(tstep/(cfl*limit))),1)
+
+        self.substeps = nums
+
+        dtime,Sw = tstep/nums,np.copy(Sw)
+
+        for _ in range(nums):
+
+            fw = self.fractional(Sw)
+
+            water = fw[upwind]*flux
+
+            water = np.bincount(neg,weights=water,minlength=Sw.size)-np.bincount(pos,weights=water,minlength=Sw.size)
+
+            inflow = np.where(qt>0,qw,fw*qt)
+
+            Sw -= dtime/Vp*(water-inflow)+Sw*expand*dtime/tstep
+
+        return Sw
+
+    def fractional(self,Sw):
+        """Returns water fractional flow at water saturation, Sw."""
+        krw,kro = self.rp.water_oil(Sw=Sw)
+
+        mw = krw/self.fluids.viscosity[0]
+        mo = kro/self.fluids.viscosity[1]
+
+        total = mw+mo
+
+        return np.divide(mw,total,out=np.zeros_like(total,dtype=float),where=total>0)
+
+    @staticmethod
+    def tmatrix(values,neg,pos,shape):
+        """Returns transmissibility matrix assembled from the face list in
+        a single COO pass."""
+        rows = np.concatenate((neg,pos,neg,pos))
+        cols = np.concatenate((pos,neg,neg,pos))
+
+        data = np.concatenate((-values,-values,values,values))
+
+        return csr((data,(rows,cols)),shape=shape)
+
+    @staticmethod
+    def throughput(flux,neg,pos,nums,qt=None):
+        """Returns the per-cell throughput: total rate leaving the grids
+        through the faces, plus the production rate."""
+        rate = np.bincount(neg,weights=np.maximum(flux,0),minlength=nums)
+        rate += np.bincount(pos,weights=np.maximum(-flux,0),minlength=nums)
+
+        if qt is not None:
+            rate += np.maximum(-qt,0)
+
+        return rate
+
+def newton_solver(grid,timestep,timesteps,T,J,Q,*,accum=100.,tol=1e-6,stol=1e-6,maxiter=50,backend=None):
+    """Returns the pressure at the time steps and iteration statistics of
+    Newton iterations for the accumulation coefficient, accum/P.
+
+    T,J,Q   : transmissibility, productivity and source matrices, sparse
+              as built by Builder, or dense arrays.
+    tol     : tolerance of residual norm.
+    stol    : tolerance of update norm.
+    maxiter : maximum number of iterations per time step.
+    backend : linear solver, Direct() by default.
+
+    Statistics are (time step, iteration, residual norm, update norm). A
+    warning is logged for the time steps not converged in maxiter.
+    """
+    T,J,Q,backend = csr(T),csr(J),_column(Q),Direct() if backend is None else backend
+
+    array,stats = np.zeros((grid.numtot,timesteps)),[]
+
+    P = np.ravel(grid.pressure_initial).astype(float)
 
     for j in range(timesteps):
 
         Pk = P.copy()
 
-        error = 1
+        for k in range(1,maxiter+1):
 
-        k = 1
+            A = accum/Pk
 
-        while error>1e-6:
+            F = -(T+J).dot(Pk)-A*(Pk-P)+Q
 
-            A = np.diag(100/Pk.flatten())
+            error = np.linalg.norm(F,2)
 
-            F = -np.matmul(T+J+A,Pk)+np.matmul(A,P)+Q
+            JACOB = -(T+J)-diags(A*P/Pk)
 
-            error = np.linalg.norm(F.flatten(),2)
+            delta = backend(JACOB.tocsr(),-F)
 
-            JACOB = -(T+J)+np.matmul(-A,np.diag(P.flatten()/Pk.flatten()))
+            Pk += delta
 
-            Pk += np.linalg.solve(JACOB,-F)
+            stats.append((j,k,float(error),float(np.linalg.norm(delta,2))))
 
-            print(f"iteration #{k}: {error = }")
-            print(f"{Pk}\n")#{F}\n
+            if error<tol or stats[-1][3]<stol:
+                break
 
-            k += 1
+        else:
+            logging.warning(f"Newton iterations could not converge at time step {j} after {maxiter} iterations.")
 
         P = Pk.copy()
 
-        array[:,j] = P.flatten()
+        array[:,j] = P
 
-    return array
+    return array,stats
 
-def picard_solver(grid,timestep,timesteps,T,J,Q):
+def picard_solver(grid,timestep,timesteps,T,J,Q,*,accum=100.,tol=1e-6,stol=1e-6,maxiter=50,backend=None):
+    """Returns the pressure at the time steps and iteration statistics of
+    Picard iterations for the accumulation coefficient, accum/P. The
+    inputs and statistics are the same as in newton_solver."""
+    T,J,Q,backend = csr(T),csr(J),_column(Q),Direct() if backend is None else backend
 
-    array = np.zeros((grid.numtot,timesteps))
+    array,stats = np.zeros((grid.numtot,timesteps)),[]
 
-    P = grid.pressure_initial
+    P = np.ravel(grid.pressure_initial).astype(float)
 
     for j in range(timesteps):
 
         Pk = P.copy()
 
-        firstIteration = True
-
-        k = 1
+        for k in range(1,maxiter+1):
 
-        while firstIteration or error>1e-6:
+            A = accum/Pk
 
-            firstIteration = False
+            D = (T+J+diags(A)).tocsr()
 
-            A = np.eye(grid.numtot)*100/Pk
+            V = A*P+Q
 
-            D = T+J+A
+            error = np.linalg.norm(V-D.dot(Pk),2)
 
-            V = np.matmul(A,P)+Q
+            Pnew = backend(D,V,Pk)
 
-            F = -np.matmul(D,Pk)+V
+            stats.append((j,k,float(error),float(np.linalg.norm(Pnew-Pk,2))))
 
-            error = np.linalg.norm(F,2)
-
-            Pk = np.linalg.solve(D,V)
+            Pk = Pnew
 
-            print(f"iteration #{k}: {error=}")
-            print(f"{Pk}\n")
+            if error<tol or stats[-1][3]<stol:
+                break
 
-            k += 1
+        else:
+            logging.warning(f"Picard iterations could not converge at time step {j} after {maxiter} iterations.")
 
         P = Pk.copy()
 
-        array[:,j] = P.flatten()
+        array[:,j] = P
+
+    return array,stats
 
-    return array
+def _column(vector):
+    """Returns the dense flat copy of sparse or dense column vector."""
+    return np.ravel(vector.toarray() if hasattr(vector,"toarray") else vector).astype(float)
 
 if __name__ == "__main__":
 
@@ -1,14 +1,18 @@
-from scipy.sparse import csr_matrix as csr
-from scipy.sparse import linalg
+import logging
+
+import numpy
+
+from scipy.sparse import issparse
 
 from ._block import Block
+from ._backend import Direct
 
 class BaseSolver(Block):
     """
     The Base Class initializing reservoir flow in Rectangular Cuboids;
     """
 
-    def __init__(self,grids,rrock,fluid,tcomp=None):
+    def __init__(self,grids,rrock,fluid,tcomp=None,backend=None):
         """
         Initialization of Base Class Solver.
 
@@ -24,13 +28,42 @@ class BaseSolver(Block):
 
         tcomp  : total compressibility, 1/psi
 
+        backend: linear solver backend, Direct (default) or Krylov
+            instance, used for all the pressure solutions.
+
         """
         super().__init__(grids,rrock,fluid,tcomp)
 
+        self.backend = backend
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @backend.setter
+    def backend(self,value):
+        """Setter for the linear solver backend."""
+        self._backend = Direct() if value is None else value
+
     @property
     def iterator(self):
         return Iterator
 
+    def steady(self,wells=None,edges=None,*,pref=0.,index=0,free=False):
+        """Returns the steady state pressure (Pa) solving (T+J)P = Q+G in a
+        single linear solve, with the properties at the current pressure
+        state of the fluid.
+
+        wells  : tuple of WellBound instances.
+        edges  : tuple of EdgeBound instances.
+        pref   : reference pressure in psi at the grid, index, fixing the
+                 pressure level when no pressure constraint is active.
+        free   : if True, T is built matrix-free, see IMPES.
+        """
+        mat = self.matrix(self.vector(1.,wells,edges),free)
+
+        return self.iterator.steady(mat,self.backend,pref*6894.76,index)
+
     @property
     def residual(self):
         return Residual
@@ -38,35 +71,112 @@ class BaseSolver(Block):
 class Iterator:
 
     @staticmethod
-    def explicit(mat,Pn):
-        """Explicit pressure solution returning P_{n+1}."""
-        RHS = csr.dot(-(mat._T+mat._J),Pn)+mat._Q+mat._G
+    def solve(mat,key,LHS,RHS,x0=None,backend=None):
+        """Returns the solution of LHS x = RHS with the backend. The LU factors
+        or preconditioners are stored in mat under the key, and a new matrix
+        set (new time step size or constraints) starts empty.
+
+        LHS     : callable returning the left hand side matrix
+        RHS     : right hand side column, or (N,k) block of columns for
+                  batches of scenarios sharing the matrix
+        """
+        backend = Direct() if backend is None else backend
+
+        return backend(LHS,Iterator.block(RHS),x0=x0,cache=mat._cache.setdefault(key,{}))
+
+    @staticmethod
+    def block(array):
+        """Returns the flat vector of a single column, or the 2D block of
+        several columns."""
+        array = numpy.asarray(array)
+
+        return array.ravel() if array.ndim<2 or array.shape[1]==1 else array
+
+    @staticmethod
+    def explicit(mat,Pn,backend=None):
+        """Explicit pressure solution returning P_{n+1}. Pn, Q and G can be
+        (N,k) blocks of scenarios, solved together."""
+        full,Pn = Pn,mat.gather(Pn)
+
+        RHS = -(mat._T.dot(Pn)+mat._J.dot(Pn))+mat._Q+mat._G
 
-        return Pn+linalg.spsolve(mat._A,RHS)
+        delta = Iterator.solve(mat,("explicit",),lambda: mat._A,RHS,None,backend)
+
+        return mat.scatter((numpy.ravel(Pn) if delta.ndim==1 else numpy.reshape(Pn,(delta.shape[0],-1)))+delta,full)
 
     @staticmethod
-    def mixed(mat,Pn,theta:float=0.5):
+    def mixed(mat,Pn,theta:float=0.5,backend=None):
         """Mixed pressure solution returning P_{n+1}."""
-        LHS = (1-theta)*(mat._T+mat._J)+mat._A
-        RHS = csr.dot(mat._A-theta*(mat._T+mat._J),Pn)+mat._Q+mat._G
+        full,Pn = Pn,mat.gather(Pn)
+
+        LHS = lambda: (1-theta)*(mat._T+mat._J)+mat._A
+        RHS = mat._A.dot(Pn)-theta*(mat._T.dot(Pn)+mat._J.dot(Pn))+mat._Q+mat._G
+
+        return mat.scatter(Iterator.solve(mat,("mixed",theta),LHS,RHS,Pn,backend),full)
+
+    @staticmethod
+    def implicit(mat,Pn,backend=None):
+        """Implicit pressure solution returning P_{n+1}. Pn, Q and G can be
+        (N,k) blocks of scenarios, solved together with the factors of
+        T+J+A computed once. With active grids, the inactive ones keep
+        their pressure."""
+        full,Pn = Pn,mat.gather(Pn)
 
-        return linalg.spsolve(LHS,RHS)
+        LHS = lambda: mat._T+mat._J+mat._A
+        RHS = mat._A.dot(Pn)+mat._Q+mat._G
+
+        return mat.scatter(Iterator.solve(mat,("implicit",),LHS,RHS,Pn,backend),full)
 
     @staticmethod
-    def implicit(mat,Pn):
-        """Implicit pressure solution returning P_{n+1}."""
-        RHS = csr.dot(mat._A,Pn)+mat._Q+mat._G
-        
-        return linalg.spsolve(mat._T+mat._J+mat._A,RHS)
+    def steady(mat,backend=None,pref:float=0.,index:int=0):
+        """Steady state pressure solution returning P. Without pressure
+        constraints, T+J is singular (pure Neumann), so the pressure at the
+        grid, index, is pinned to pref (Pa), and the symmetric reduced
+        system of the other grids is solved. With active grids, the index
+        must be active, and inactive grids are not a number."""
+        T = mat._T if issparse(mat._T) else mat._T.tocsr()
+
+        LHS = (T+mat._J).tocsr()
+        RHS = numpy.asarray(mat._Q+mat._G).ravel()
+
+        if mat._J.diagonal().any():
+            return mat.scatter(Iterator.solve(mat,("steady",),lambda: LHS,RHS,None,backend),numpy.nan)
+
+        if not numpy.isclose(RHS.sum(),0.,atol=1e-8*numpy.abs(RHS).sum()):
+            logging.warning(f"Net inflow {RHS.sum():.3e} m3/sec is not zero, no steady state exists.")
+
+        if mat._cells is not None:
+
+            if not numpy.isin(index,mat._cells):
+                raise ValueError(f"Reference grid {index} is not active.")
+
+            index = int(numpy.searchsorted(mat._cells,index))
+
+        keep = numpy.arange(RHS.size)!=index
+
+        press = numpy.full(RHS.size,pref)
+
+        reduced = lambda: LHS[keep][:,keep]
+
+        press[keep] = Iterator.solve(mat,("steady",index),reduced,RHS[keep]-pref*LHS[keep][:,index].toarray().ravel(),None,backend)
+
+        return mat.scatter(press,numpy.nan)
 
 class Residual:
+    """Residuals are evaluated term by term, so T can be a sparse matrix or a
+    matrix-free Stencil, and no new sparse sum is built per call. With
+    active grids, the residual of inactive grids is zero."""
 
     @staticmethod
     def explicit(mat,Pn,P):
         """Returns residual vector in SI units, (m**3)/(sec)"""
-        return -csr.dot(mat._A,P)+csr.dot(mat._A-(mat._T+mat._J),Pn)+mat._Q+mat._G
+        Pn,P = mat.gather(Pn),mat.gather(P)
+
+        return mat.scatter(-mat._A.dot(P)+mat._A.dot(Pn)-(mat._T.dot(Pn)+mat._J.dot(Pn))+mat._Q+mat._G)
 
     @staticmethod
     def implicit(mat,Pn,P):
         """Returns residual vector in SI units, (m**3)/(sec)"""
-        return -csr.dot(mat._T+mat._J+mat._A,P)+csr.dot(mat._A,Pn)+mat._Q+mat._G
\ No newline at end of file
+        Pn,P = mat.gather(Pn),mat.gather(P)
+
+        return mat.scatter(-(mat._T.dot(P)+mat._J.dot(P)+mat._A.dot(P))+mat._A.dot(Pn)+mat._Q+mat._G)
\ No newline at end of file
@@ -0,0 +1,79 @@
+class State:
+    """Read-only view of the solver state after a time step. Pressure is
+    not copied, and well rates are evaluated when the state is created,
+    so the states can be kept after the solver advances."""
+
+    __slots__ = ("_index","_time","_press","_satur","_inflow","_stats")
+
+    def __init__(self,index:int,time:float,press,satur=None,rates=None,stats=(0,None,True)):
+        """Inputs should be in SI units.
+
+        index   : time step index, zero for the initial state
+        time    : time at the end of the time step (sec)
+        press   : grid pressures (Pa)
+        satur   : water saturations of grids, None for single phase
+        rates   : inflows of wells and edges (m3/sec)
+        stats   : number of iterations, last residual norm and convergence
+        """
+        self._index = index
+        self._time = time
+
+        self._press = self.readonly(press)
+        self._satur = None if satur is None else self.readonly(satur)
+
+        self._inflow = None if rates is None else self.readonly(rates)
+        self._stats = stats
+
+    @staticmethod
+    def readonly(array):
+        """Returns non-writeable flat view of the array."""
+        view = array.view().reshape(-1)
+        view.flags.writeable = False
+        return view
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def time(self):
+        """Converting from seconds to days."""
+        return self._time/(24*60*60)
+
+    @property
+    def press(self):
+        """Converting from Pa to psi."""
+        return self._press/6894.76
+
+    @property
+    def satur(self):
+        return self._satur
+
+    @property
+    def _rates(self):
+        """Returns the inflows of wells and edges (m3/sec)."""
+        return self._inflow
+
+    @property
+    def rates(self):
+        """Converting from SI Units to Oil Field Units."""
+        return None if self._rates is None else self._rates*(3.28084**3)*(24*60*60)
+
+    @property
+    def niter(self):
+        return self._stats[0]
+
+    @property
+    def error(self):
+        return self._stats[1]
+
+    @property
+    def converged(self):
+        return self._stats[2]
+
+    def __repr__(self):
+        return f"State(index={self.index}, time={self.time}, converged={self.converged})"
+
+if __name__ == "__main__":
+
+    pass
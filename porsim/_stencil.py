@@ -0,0 +1,178 @@
+from numbers import Number
+
+import numpy
+
+from scipy.sparse import csr_matrix as csr
+from scipy.sparse import issparse
+from scipy.sparse import linalg
+
+class Stencil(linalg.LinearOperator):
+    """Matrix-free 7-point stencil operator on structured cuboid grids. It
+    applies T (plus an optional diagonal such as J and A) to a pressure
+    vector with shifted array arithmetic on the face transmissibilities,
+    without materializing the matrix."""
+
+    def __init__(self,xface,yface,zface,diag=None):
+        """
+        xface   : x-face values in (znums,ynums,xnums-1) shaped array
+        yface   : y-face values in (znums,ynums-1,xnums) shaped array
+        zface   : z-face values in (znums-1,ynums,xnums) shaped array
+        diag    : additional diagonal values, e.g., J+A, default is zero
+        """
+        self.grid = (zface.shape[0]+1,yface.shape[1]+1,xface.shape[2]+1)
+
+        self.xface = xface
+        self.yface = yface
+        self.zface = zface
+
+        nums = int(numpy.prod(self.grid))
+
+        self.diag = numpy.zeros(nums) if diag is None else numpy.ravel(diag)
+
+        super().__init__(dtype=numpy.float64,shape=(nums,nums))
+
+    @staticmethod
+    def slots(shape,xneg,yneg,zneg):
+        """Returns the positions of faces in the structured face arrays,
+        None for an axis whose faces are already in structured order."""
+        xnums,ynums,znums = shape
+
+        def slot(neg,nx,ny):
+            x,y,z = neg%xnums,(neg//xnums)%ynums,neg//(xnums*ynums)
+            slot = x+nx*(y+ny*z)
+            return None if numpy.array_equal(slot,numpy.arange(slot.size)) else slot
+
+        xslot = slot(numpy.asarray(xneg),xnums-1,ynums)
+        yslot = slot(numpy.asarray(yneg),xnums,ynums-1)
+        zslot = slot(numpy.asarray(zneg),xnums,ynums)
+
+        return xslot,yslot,zslot
+
+    @staticmethod
+    def build(shape,slots,X,Y,Z,diag=None):
+        """Returns the operator from the face values ordered as in the
+        grid's face index arrays, e.g., as returned by Block.Tvec."""
+        xnums,ynums,znums = shape
+
+        def face(values,slot,fshape):
+            if slot is None:
+                return values.reshape(fshape)
+            ordered = numpy.empty_like(values)
+            ordered[slot] = values
+            return ordered.reshape(fshape)
+
+        xface = face(X,slots[0],(znums,ynums,xnums-1))
+        yface = face(Y,slots[1],(znums,ynums-1,xnums))
+        zface = face(Z,slots[2],(znums-1,ynums,xnums))
+
+        return Stencil(xface,yface,zface,diag)
+
+    def _matvec(self,x):
+        """Returns the product of the operator with vector x."""
+        x = numpy.ravel(x)
+
+        y = self.diag*x
+
+        X,Y = x.reshape(self.grid),y.reshape(self.grid)
+
+        flux = self.xface*(X[:,:,:-1]-X[:,:,1:])
+        Y[:,:,:-1] += flux
+        Y[:,:,1:] -= flux
+
+        flux = self.yface*(X[:,:-1,:]-X[:,1:,:])
+        Y[:,:-1,:] += flux
+        Y[:,1:,:] -= flux
+
+        flux = self.zface*(X[:-1,:,:]-X[1:,:,:])
+        Y[:-1,:,:] += flux
+        Y[1:,:,:] -= flux
+
+        return y
+
+    def _rmatvec(self,x):
+        """The stencil is symmetric."""
+        return self._matvec(x)
+
+    def _adjoint(self):
+        """The stencil is symmetric."""
+        return self
+
+    def diagonal(self):
+        """Returns the main diagonal of the operator."""
+        diag = numpy.copy(self.diag).reshape(self.grid)
+
+        diag[:,:,:-1] += self.xface
+        diag[:,:,1:] += self.xface
+
+        diag[:,:-1,:] += self.yface
+        diag[:,1:,:] += self.yface
+
+        diag[:-1,:,:] += self.zface
+        diag[1:,:,:] += self.zface
+
+        return diag.ravel()
+
+    def tocsr(self):
+        """Returns the operator assembled as CSR matrix, e.g., for direct
+        solvers and incomplete factorizations."""
+        index = numpy.arange(self.shape[0]).reshape(self.grid)
+
+        neg = (index[:,:,:-1],index[:,:-1,:],index[:-1,:,:])
+        pos = (index[:,:,1:],index[:,1:,:],index[1:,:,:])
+
+        neg = numpy.concatenate([face.ravel() for face in neg])
+        pos = numpy.concatenate([face.ravel() for face in pos])
+
+        faces = numpy.concatenate((self.xface.ravel(),self.yface.ravel(),self.zface.ravel()))
+
+        rows = numpy.concatenate((index.ravel(),neg,pos))
+        cols = numpy.concatenate((index.ravel(),pos,neg))
+        data = numpy.concatenate((self.diagonal(),-faces,-faces))
+
+        return csr((data,(rows,cols)),shape=self.shape)
+
+    def tocsc(self):
+        """Returns the operator assembled as CSC matrix."""
+        return self.tocsr().tocsc()
+
+    def __add__(self,other):
+        """Returns the sum as a stencil for stencils and diagonal matrices."""
+        if isinstance(other,Stencil):
+            return Stencil(self.xface+other.xface,self.yface+other.yface,
+                self.zface+other.zface,self.diag+other.diag)
+
+        if issparse(other) and other.shape==self.shape:
+            diag = other.diagonal()
+            if numpy.count_nonzero(diag)==other.count_nonzero():
+                return Stencil(self.xface,self.yface,self.zface,self.diag+diag)
+
+        return super().__add__(other)
+
+    def __radd__(self,other):
+        return self.__add__(other)
+
+    def __mul__(self,other):
+        """Returns the scaled stencil for scalars, the product otherwise."""
+        if isinstance(other,Number):
+            return Stencil(other*self.xface,other*self.yface,other*self.zface,other*self.diag)
+
+        return super().__mul__(other)
+
+    def __rmul__(self,other):
+        if isinstance(other,Number):
+            return self.__mul__(other)
+
+        return super().__rmul__(other)
+
+    def __neg__(self):
+        return self.__mul__(-1.)
+
+    def __sub__(self,other):
+        return self.__add__(-other)
+
+    def __rsub__(self,other):
+        return self.__neg__().__add__(other)
+
+if __name__ == "__main__":
+
+    pass
@@ -0,0 +1,112 @@
+import numpy
+
+from scipy.sparse import csr_matrix as csr
+
+class Table():
+    """Columnar table of well and edge constraints with one row per
+    constrained grid, so that J and Q are assembled in a single pass."""
+
+    def __init__(self,index,prod,cond,press,group,constrs=None):
+        """
+        Inputs should be in SI units.
+
+        index   : grid index of the row
+        prod    : block productivity (transmissibility) of the row
+        cond    : constraint condition, pressure or rate, of the row
+        press   : True for pressure constraints, False for rates
+        group   : constraint (well or edge) id of the row
+        constrs : number of constraints, including those without rows;
+                  one more than the last group id by default
+        """
+        self.index = index
+        self._prod = prod
+        self._cond = cond
+        self.press = press
+        self.group = group
+
+        self.constrs = (0 if group.size==0 else int(group.max())+1) if constrs is None else constrs
+
+    @staticmethod
+    def stack(constrs,indices):
+        """Returns the table built from constraints and their grid indices."""
+        sizes = [len(index) for index in indices]
+
+        if len(sizes)==0:
+            return Table(*(numpy.zeros(0,dtype=dtype) for dtype in (int,float,float,bool,int)),len(constrs))
+
+        index = numpy.concatenate(indices).astype(numpy.int64)
+        group = numpy.repeat(numpy.arange(len(constrs)),sizes)
+
+        prod = numpy.concatenate([numpy.ravel(constr._prod) for constr in constrs])
+
+        cond = numpy.repeat([constr._cond for constr in constrs],sizes).astype(numpy.float64)
+        press = numpy.repeat([constr.sort=="press" for constr in constrs],sizes)
+
+        return Table(index,prod,cond,press,group,len(constrs))
+
+    def subset(self,renum):
+        """Returns the table of the rows in the grids numbered nonnegative
+        in renum, with the grid indices replaced by their numbers."""
+        index = renum[self.index]
+
+        keep = index>=0
+
+        return Table(index[keep],self._prod[keep],self._cond[keep],self.press[keep],self.group[keep],self.constrs)
+
+    @property
+    def nums(self):
+        """Returns the number of constraints in the table."""
+        return self.constrs
+
+    @property
+    def total(self):
+        """Returns the total productivity of each constraint (segmented sum)."""
+        return numpy.bincount(self.group,weights=self._prod,minlength=self.nums)
+
+    def jmatrix(self,shape):
+        """Returns J diagonal matrix of pressure constraints."""
+        index = self.index[self.press]
+
+        return csr((self._prod[self.press],(index,index)),shape=shape)
+
+    def qvalues(self):
+        """Returns Q values of the rows, rate constraints are allocated
+        to the grids in proportion to their productivity."""
+        values = self._prod*self._cond
+
+        rates = ~self.press
+
+        values[rates] /= self.total[self.group[rates]]
+
+        return values
+
+    def dvalues(self,press,ratio):
+        """Returns the diagonal pressure derivative of the pressure constraint
+        inflows, prod*(cond-press), beyond the -prod term already in J. Rate
+        allocation is lagged.
+
+        press   : grid pressures
+        ratio   : relative pressure derivative of the grid productivities
+        """
+        index = self.index[self.press]
+
+        values = self._prod[self.press]*ratio[index]*(self._cond[self.press]-press[index])
+
+        return numpy.bincount(index,weights=values,minlength=press.size)
+
+    def rates(self,press):
+        """Returns the inflow of each constraint at the grid pressures,
+        press, rate constraints deliver their condition."""
+        values = self.qvalues()
+
+        values[self.press] -= self._prod[self.press]*press[self.index[self.press]]
+
+        return numpy.bincount(self.group,weights=values,minlength=self.nums)
+
+    def qmatrix(self,shape):
+        """Returns Q column matrix of pressure and rate constraints."""
+        return csr((self.qvalues(),(self.index,numpy.zeros_like(self.index))),shape=shape)
+
+if __name__ == "__main__":
+
+    pass
@@ -2,9 +2,9 @@
 
 # 2. Well and Boundary Constraints
 # from ._edge import Edge
-from ._well import Well
+from ._well import WellBound
 # from .constraints import Locator
 # from .constraints import Schedule
 
 # 3. Time settinga
-from ._timing import bysteps,regular
\ No newline at end of file
+from ._time import Time, Stepper
\ No newline at end of file
@@ -1,12 +1,12 @@
 import numpy as np
 
 class Constraint():
-	"""
+    """
     Represents base class for the constraints used in a reservoir simulator.
     """
     VALID_SORTS = {"press", "lrate", "orate", "wrate", "grate"}
 
-	def __init__(self,*,start:float=0,stop:float=None,**kwargs):
+    def __init__(self,*,start:float=0,stop:float=None,**kwargs):
         """
         Parameters
         ----------
@@ -34,7 +34,7 @@ class Constraint():
         elif len(constraint)>1:
             raise ValueError(f"Multiple well conditions provided: {list(constraint.keys())}. Assign only one.")
 
-	@property
+    @property
     def start(self):
         """Getter for well constraint start time."""
         return self._start/(24*60*60)
@@ -66,8 +66,8 @@ class Time():
 		"""Setter for times array."""
 		self._times = np.insert(np.cumsum(self._steps),0,0)
 
-	@staticmehtod
-	def get(step:float|np.ndarray,*,nums:int=None) -> Time:
+	@staticmethod
+	def get(step:float|np.ndarray,*,nums:int=None) -> "Time":
 		"""
 		Creates a Time instance with (ir)regularly spaced time steps.
 
@@ -80,6 +80,127 @@ class Time():
 		"""
 		return Time(np.asarray(step)) if nums is None else Time(np.full(nums,step))
 
+class Stepper():
+	"""Adaptive time step controller stepping between the report times of
+	a Time schedule. The step grows when the nonlinear iterations converge
+	fast and the changes are small, is cut when they fail, and lands on
+	schedule events such as well start and stop times."""
+
+	def __init__(self,step:float=1.,*,mini:float=1e-3,maxi:float=None,grow:float=2.,cut:float=0.5,fast:int=3,dpmax:float=200.,dsmax:float=0.05):
+		"""
+		Initializes the adaptive time stepping.
+
+		Parameters
+		----------
+		step    : first time step in days.
+		mini    : minimum time step in days, a failure below it raises.
+		maxi    : maximum time step in days, default is no limit.
+		grow    : maximum growth factor of the step after a success.
+		cut     : reduction factor of the step after a failure.
+		fast    : number of iterations counted as fast convergence.
+		dpmax   : targeted maximum pressure change per step in psi.
+		dsmax   : targeted maximum saturation change per step.
+
+		"""
+		self.step = step
+		self.mini = mini
+		self.maxi = maxi
+
+		self.grow = grow
+		self.cut = cut
+		self.fast = fast
+
+		self.dpmax = dpmax
+		self.dsmax = dsmax
+
+		self.accepts = 0
+		self.rejects = 0
+
+	@property
+	def step(self):
+		"""Getter for the next time step."""
+		return self._step/(24*60*60)
+
+	@step.setter
+	def step(self,value):
+		"""Setter for the next time step."""
+		self._step = value*(24*60*60)
+
+	@property
+	def mini(self):
+		"""Getter for the minimum time step."""
+		return self._mini/(24*60*60)
+
+	@mini.setter
+	def mini(self,value):
+		"""Setter for the minimum time step."""
+		self._mini = value*(24*60*60)
+
+	@property
+	def maxi(self):
+		"""Getter for the maximum time step."""
+		return None if self._maxi==np.inf else self._maxi/(24*60*60)
+
+	@maxi.setter
+	def maxi(self,value):
+		"""Setter for the maximum time step."""
+		self._maxi = np.inf if value is None else value*(24*60*60)
+
+	@property
+	def dpmax(self):
+		"""Getter for the targeted pressure change."""
+		return self._dpmax/6894.76
+
+	@dpmax.setter
+	def dpmax(self,value):
+		"""Setter for the targeted pressure change."""
+		self._dpmax = value*6894.76
+
+	def target(self,tcurr:float,tnext:float,events=()):
+		"""
+		Returns the end time of the next step starting at tcurr, not going
+		beyond the report time, tnext, and the first event in between. A
+		remainder shorter than the minimum step is merged into the step.
+		All the times are in seconds.
+		"""
+		tstop = min([tnext]+[event for event in events if tcurr<event<tnext])
+
+		tend = tcurr+self._step
+
+		return tstop if tstop-tend<self._mini else tend
+
+	def accept(self,tstep:float,niter:int,dpress:float=0.,dsatur:float=0.):
+		"""
+		Updates the next step after a converged step.
+
+		Parameters
+		----------
+		tstep   : size of the converged step in seconds.
+		niter   : number of nonlinear iterations it took.
+		dpress  : maximum pressure change over the step in Pa.
+		dsatur  : maximum saturation change over the step.
+
+		"""
+		step = self._step*self.grow if niter<=self.fast else self._step
+
+		ratio = max(dpress/self._dpmax,dsatur/self.dsmax)
+
+		if ratio>0:
+			step = min(step,max(tstep/ratio,tstep*self.cut))
+
+		self._step = min(max(step,self._mini),self._maxi)
+
+		self.accepts += 1
+
+	def reject(self,tstep:float):
+		"""Cuts the next step after a step of tstep seconds failed."""
+		self._step = tstep*self.cut
+
+		self.rejects += 1
+
+		if self._step<self._mini:
+			raise RuntimeError(f"Time step is cut below the minimum, {self.mini} days.")
+
 if __name__ == "__main__":
 
 	t = Time((1,1,1,1,1,1,1,1,1,1))
@@ -0,0 +1,150 @@
+import numpy as np
+
+from porsim import IMPES
+
+class Grids():
+    """Structured grids in SI units with x-index changing fastest."""
+
+    def __init__(self,xnums,ynums=1,znums=1,delta=(10.,10.,5.)):
+
+        self.xnums,self.ynums,self.znums = xnums,ynums,znums
+
+        self.nums = xnums*ynums*znums
+        self.index = np.arange(self.nums)
+
+        index = self.index.reshape((znums,ynums,xnums))
+
+        self._xneg,self._xpos = index[:,:,:-1].ravel(),index[:,:,1:].ravel()
+        self._yneg,self._ypos = index[:,:-1,:].ravel(),index[:,1:,:].ravel()
+        self._zneg,self._zpos = index[:-1,:,:].ravel(),index[1:,:,:].ravel()
+
+        self.xneg,self.yneg,self.zneg = self._xneg,self._yneg,self._zneg
+        self.xpos,self.ypos,self.zpos = self._xpos,self._ypos,self._zpos
+
+        self._xdelta,self._ydelta,self._zdelta = (np.full(self.nums,d) for d in delta)
+
+        self._xarea = self._ydelta*self._zdelta
+        self._yarea = self._zdelta*self._xdelta
+        self._zarea = self._xdelta*self._ydelta
+
+        self._volume = self._xdelta*self._ydelta*self._zdelta
+        self._depths = 1000.+(self.index//(xnums*ynums)+0.5)*delta[2]
+
+        self._xmax = self.index%xnums==xnums-1
+
+class Rock():
+
+    def __init__(self,nums):
+
+        perm = 1e-13*np.exp(np.random.default_rng(0).normal(0,1,nums))
+
+        self._xperm,self._yperm,self._zperm = perm,perm,perm/10
+
+        self._poro,self._comp = np.full(nums,0.2),1e-10
+
+class Gas():
+    """Fluid with pressure dependent mobility and compressibility."""
+
+    def __init__(self):
+        self._grad,self._mobil,self._comp,self._press = 2000.,np.array([1.]),1e-8,None
+
+    @property
+    def _press(self):
+        return self.__press
+
+    @_press.setter
+    def _press(self,value):
+        self.__press = value
+
+        if value is not None:
+            self._mobil = 1e-3/(1+(value/2e7)**2)
+            self._comp = 1/value
+
+class Constr():
+    """Well in the grids, index, or edge at the face, with the pressure,
+    or the rate if given, in SI units. The productivity, prod, is set by
+    the solver unless given."""
+
+    def __init__(self,index=(),face=None,press=2e7,rate=None,prod=None):
+        self.index,self.axis,self.face,self._radius,self.skin = index,"z",face,0.1,0.
+
+        self.sort,self._cond = ("press",press) if rate is None else ("orate",rate)
+
+        self._start,self._stop = 0.,None
+
+        if prod is not None:
+            self._prod = np.asarray(prod,dtype=float)
+
+def impes(grids=None,rock=None,**kwargs):
+    """Returns IMPES solver for the gas on 5x4x3 grids produced by a well
+    in the grids 6 and 21 and supported by the pressure at the x-max face."""
+    grids = Grids(5,4,3) if grids is None else grids
+    rock = Rock(grids.nums) if rock is None else rock
+
+    kwargs.setdefault("wells",(Constr((6,21),press=1e7),))
+    kwargs.setdefault("edges",(Constr(face="xmax",press=3e7),))
+
+    return IMPES(grids,rock,Gas(),**kwargs)
+
+class Reservoir():
+    """Line of grids in field units with the x-max neighbor indices."""
+
+    def __init__(self,nums,volume=1e5,poro=0.2,comp=1e-6):
+
+        self.grid_numtot = nums
+
+        self.grid_indices = np.zeros((nums,7),dtype=int)
+
+        self.grid_indices[:,0] = np.arange(nums)
+        self.grid_indices[:-1,2] = np.arange(1,nums)
+
+        self.grid_hasxmax = np.arange(nums)<nums-1
+        self.grid_hasymax = np.zeros(nums,dtype=bool)
+        self.grid_haszmax = np.zeros(nums,dtype=bool)
+
+        self.grid_volumes,self.porosity = np.full(nums,volume),np.full(nums,poro)
+
+        self.compressibility = comp
+
+class Liquids():
+    """Slightly compressible water and oil."""
+
+    def __init__(self):
+        self.viscosity,self.fvf,self.compressibility = (0.5,2.),(1.,1.2),(3e-6,1e-5)
+
+class Corey():
+    """Quadratic relative permeabilities with 0.2 connate water and
+    0.2 residual oil saturation."""
+
+    def water_oil(self,Sw):
+        S = np.clip((np.asarray(Sw,dtype=float)-0.2)/0.6,0,1)
+        return S**2,(1-S)**2
+
+class Wells():
+
+    def __init__(self,*itemnames):
+        self.itemnames = itemnames
+
+def waterflood(solver,nums=10,steps=5,tstep=1.,**kwargs):
+    """Returns the two-phase solver class instance on a line of grids with
+    a water rate injector at the first grid and a bottom hole pressure
+    producer at the last grid."""
+    solver = solver(Reservoir(nums),Liquids(),Corey(),Wells("INJ","PROD"),**kwargs)
+
+    solver.TXP,solver.TYP,solver.TZP = np.full(nums,50.),np.zeros(nums),np.zeros(nums)
+
+    solver.well_grids = np.array([0,nums-1])
+    solver.well_waterflags = np.array([True,True])
+    solver.well_oilflags = np.array([False,True])
+    solver.well_bhpflags = np.array([False,True])
+    solver.well_limits = np.array([50.,1000.])
+
+    solver.JR = np.full(2,10.)
+
+    solver.time_step,solver.time_array = tstep,np.arange(steps)*tstep
+
+    solver.pressure,solver.Sw = np.zeros((nums,steps+1)),np.zeros((nums,steps+1))
+
+    solver.pressure[:,0],solver.Sw[:,0] = 1500.,0.2
+
+    return solver
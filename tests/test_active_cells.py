@@ -0,0 +1,124 @@
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Multigrid
+
+from fixtures import Grids, Rock, impes
+
+class TestActiveCells(unittest.TestCase):
+
+    def setUp(self):
+
+        self.grids = Grids(5,4,3)
+
+        self.rock = Rock(self.grids.nums)
+
+        # a shale lens of zero permeability and a pinch-out of zero porosity
+        for key in ("_xperm","_yperm","_zperm"):
+            getattr(self.rock,key)[[27,28,32,33]] = 0.
+
+        self.rock._poro[[44,49]] = 0.
+
+        self.Pn = np.full((self.grids.nums,1),2e7)
+
+    def solver(self,active=True):
+
+        return impes(self.grids,self.rock,active=active)
+
+    def test_compressed_system(self):
+
+        solver = self.solver()
+
+        mat = solver(self.Pn,86400.)
+
+        self.assertEqual(mat._A.shape,(54,54))
+        self.assertEqual(mat._cells.size,54)
+        self.assertNotIn(27,mat._cells)
+        self.assertNotIn(44,mat._cells)
+
+        # zero permeability grids are isolated, so compressing them out
+        # leaves the active grid solution unchanged
+        self.rock._poro[[44,49]] = 0.2
+
+        full = self.solver(None)
+        less = self.solver(~np.isin(self.grids.index,[27,28,32,33]))
+
+        np.testing.assert_allclose(less.iterator.implicit(less(self.Pn,86400.),self.Pn),
+            full.iterator.implicit(full(self.Pn,86400.),self.Pn),rtol=1e-10)
+
+    def test_nonlinear_iterations(self):
+
+        solver,pressures = self.solver(),[]
+
+        for jacobian in (None,True,"numeric","jfnk"):
+
+            mat = solver.iterate(solver(self.Pn,86400.),self.Pn,86400.,jacobian=jacobian,tol=1e-9)
+
+            self.assertTrue(solver.converged)
+
+            pressures.append(solver.iterator.implicit(mat,self.Pn))
+
+        for press in pressures[1:]:
+            np.testing.assert_allclose(press,pressures[0],rtol=1e-6)
+
+        np.testing.assert_array_equal(pressures[0][[27,44]],2e7)
+
+    def test_jacobian_matches_finite_difference(self):
+
+        solver,tstep = self.solver(),86400.
+
+        press = 2e7+4e6*np.random.default_rng(1).random(self.grids.nums)
+
+        pprev = 0.98*press.reshape((-1,1))
+
+        def residual(press):
+            mat = solver(press.reshape((-1,1)),tstep)
+            return mat.gather(np.asarray(solver.residual.implicit(mat,pprev,press.reshape((-1,1)))).ravel())
+
+        mat = solver(press.reshape((-1,1)),tstep)
+
+        jacobian = solver.jacobian(mat,press,tstep,pprev).toarray()
+
+        self.assertEqual(jacobian.shape,(54,54))
+
+        resid,numeric = residual(press),np.zeros_like(jacobian)
+
+        for column,index in enumerate(mat._cells):
+            perturbed = np.copy(press)
+            perturbed[index] += 10.
+            numeric[:,column] = (residual(perturbed)-resid)/10.
+
+        # the grids 24 and 29 face the zero porosity grids 44 and 49
+        np.testing.assert_allclose(jacobian,numeric,atol=1e-5*np.abs(numeric).max())
+
+    def test_steady(self):
+
+        press = self.solver().steady()
+
+        self.assertTrue(np.all(np.isnan(press[[27,28,32,33,44,49]])))
+        self.assertEqual(np.isnan(press).sum(),6)
+
+    def test_multigrid_rejected(self):
+
+        solver = self.solver()
+
+        solver.backend = Multigrid(solver.shape,coarsest=8)
+
+        with self.assertRaisesRegex(ValueError,"active grids"):
+            solver.iterator.implicit(solver(self.Pn,86400.),self.Pn,solver.backend)
+
+        solver = self.solver(None)
+
+        mat = solver(self.Pn,86400.)
+
+        press = solver.iterator.implicit(mat,self.Pn,Multigrid(solver.shape,coarsest=8))
+
+        np.testing.assert_allclose(press,solver.iterator.implicit(solver(self.Pn,86400.),self.Pn),rtol=1e-6)
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Direct, Krylov
+
+from fixtures import impes
+
+class TestBatchSolve(unittest.TestCase):
+
+    def setUp(self):
+
+        self.solver = impes()
+
+        self.Pn = np.full((self.solver.nums,1),2e7)
+
+        self.mat = self.solver(self.Pn,86400.)
+
+        rates = np.zeros((self.solver.nums,3))
+
+        rates[30] = (0.,1e-4,-2e-4)
+
+        self.Q = self.mat._Q.toarray()+rates
+
+    def test_implicit(self):
+
+        for backend in (Direct(),Krylov("bicgstab","ilu",rtol=1e-12)):
+
+            batch = self.solver(self.Pn,86400.).batch(Q=self.Q)
+
+            press = self.solver.iterator.implicit(batch,self.Pn,backend)
+
+            self.assertEqual(press.shape,self.Q.shape)
+            self.assertEqual(len(batch._cache),1)
+
+            for index in range(3):
+                single = self.solver(self.Pn,86400.).batch(Q=self.Q[:,[index]])
+                np.testing.assert_allclose(press[:,index],self.solver.iterator.implicit(single,self.Pn,backend),rtol=1e-9)
+
+    def test_explicit(self):
+
+        Pn = np.hstack([self.Pn,1.01*self.Pn,0.99*self.Pn])
+
+        press = self.solver.iterator.explicit(self.mat.batch(Q=self.Q),Pn)
+
+        for index in range(3):
+            single = self.solver(self.Pn,86400.).batch(Q=self.Q[:,[index]])
+            np.testing.assert_allclose(press[:,index],self.solver.iterator.explicit(single,Pn[:,[index]]),rtol=1e-12)
+
+if __name__ == "__main__":
+
+    unittest.main()
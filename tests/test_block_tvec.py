@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Block, Mean
+
+from fixtures import Gas, Grids, Rock
+
+class TestBlockTvec(unittest.TestCase):
+
+    def setUp(self):
+
+        self.grids = Grids(5,4,3)
+
+        self.rock = Rock(self.grids.nums)
+
+        # impermeable neighbors 27 and 28, and 32 impermeable in x only
+        for key in ("_xperm","_yperm","_zperm"):
+            getattr(self.rock,key)[[27,28]] = 0.
+
+        self.rock._xperm = np.where(self.grids.index==32,0.,self.rock._xperm)
+
+        fluid = Gas()
+
+        fluid._press = 2e7+4e6*np.random.default_rng(5).random(self.grids.nums)
+
+        self.block = Block(self.grids,self.rock,fluid)
+
+    def diffuse(self):
+        """Returns the face fluxes of the harmonic mean recomputed from
+        the block transmissibilities at every call."""
+        fluid = (self.block._mobil,self.block._power)
+
+        with np.errstate(invalid="ignore"):
+            return tuple(Mean.diffuse(flow,*fluid,neg,pos) for flow,neg,pos in zip(
+                (self.block._xflow,self.block._yflow,self.block._zflow),
+                (self.block._xneg,self.block._yneg,self.block._zneg),
+                (self.block._xpos,self.block._ypos,self.block._zpos)))
+
+    def test_matches_diffuse(self):
+
+        for tvect,dvect in zip(self.block.Tvec(),self.diffuse()):
+
+            # faces between two impermeable grids are zero, not 0/0
+            np.testing.assert_allclose(tvect,np.nan_to_num(dvect,nan=0.),rtol=1e-14,atol=0.)
+
+        xvect = self.block.Tvec()[0]
+
+        self.assertEqual(xvect[np.flatnonzero(self.grids.xneg==27)[0]],0.)
+        self.assertEqual(xvect[np.flatnonzero(self.grids.xneg==31)[0]],0.)
+        self.assertGreater(self.block.Tvec()[1][np.flatnonzero(self.grids.yneg==32)[0]],0.)
+
+    def test_rock_update(self):
+
+        self.rock._zperm = 3*self.rock._zperm
+
+        self.block.rrock = self.rock
+
+        np.testing.assert_allclose(self.block.Tvec()[2],np.nan_to_num(self.diffuse()[2],nan=0.),rtol=1e-14,atol=0.)
+
+if __name__ == "__main__":
+
+    unittest.main()
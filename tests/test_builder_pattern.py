@@ -0,0 +1,134 @@
+import unittest
+
+import numpy as np
+
+from scipy.sparse import csr_matrix as csr
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Builder, Filler, Stencil
+
+from fixtures import Constr, Grids
+
+class Vec():
+
+    def __init__(self,W,B=()):
+        self._W,self._B = W,B
+
+class TestBuilderPattern(unittest.TestCase):
+
+    def test_tmatrix_single_pass(self):
+
+        grids = Grids(5,4,3)
+
+        build = Builder(grids)
+
+        rng = np.random.default_rng(0)
+
+        X = rng.random(grids.xneg.size)
+        Y = rng.random(grids.yneg.size)
+        Z = rng.random(grids.zneg.size)
+
+        matrix = csr(build.square)
+
+        matrix = Filler.tmatrix(matrix,X,grids.xneg,grids.xpos)
+        matrix = Filler.tmatrix(matrix,Y,grids.yneg,grids.ypos)
+        matrix = Filler.tmatrix(matrix,Z,grids.zneg,grids.zpos)
+
+        tmatrix = build.tpattern.tmatrix(X,Y,Z)
+
+        np.testing.assert_array_almost_equal(tmatrix.toarray(),matrix.toarray())
+
+    def test_pattern_reused(self):
+
+        grids = Grids(4,3)
+
+        build = Builder(grids)
+
+        X = np.ones(grids.xneg.size)
+        Y = np.ones(grids.yneg.size)
+        Z = np.ones(grids.zneg.size)
+
+        tmatrix1 = build.tpattern.tmatrix(X,Y,Z)
+        tmatrix2 = build.tpattern.tmatrix(2*X,2*Y,2*Z)
+
+        self.assertIs(build.tpattern,build.tpattern)
+        self.assertTrue(np.shares_memory(tmatrix1.indices,tmatrix2.indices))
+
+        np.testing.assert_array_almost_equal(tmatrix2.data,2*tmatrix1.data)
+        np.testing.assert_array_almost_equal(tmatrix1.sum(axis=1),np.zeros((grids.nums,1)))
+
+    def test_stencil_matches_tmatrix(self):
+
+        grids = Grids(5,4,3)
+
+        build = Builder(grids)
+
+        rng = np.random.default_rng(1)
+
+        X = rng.random(grids.xneg.size)
+        Y = rng.random(grids.yneg.size)
+        Z = rng.random(grids.zneg.size)
+
+        tmatrix = build.tpattern.tmatrix(X,Y,Z)
+        stencil = Stencil.build(build.shape,build.tstencil,X,Y,Z)
+
+        press = rng.random(grids.nums)
+
+        np.testing.assert_array_almost_equal(stencil.dot(press),tmatrix.dot(press))
+        np.testing.assert_array_almost_equal(stencil.diagonal(),tmatrix.diagonal())
+        np.testing.assert_array_almost_equal(stencil.tocsr().toarray(),tmatrix.toarray())
+
+        diagonal = csr((np.ones(grids.nums),(grids.index,grids.index)),shape=build.square)
+
+        self.assertIsInstance(stencil+diagonal,Stencil)
+
+        np.testing.assert_array_almost_equal((0.5*stencil+diagonal).dot(press),(0.5*tmatrix+diagonal).dot(press))
+
+    def test_constraint_table(self):
+
+        grids = Grids(6)
+
+        build = Builder(grids)
+
+        wells = (
+            Constr((0,),press=100.,prod=[2.]),
+            Constr((2,3),rate=8.,prod=[1.,3.]),
+            Constr((3,),press=50.,prod=[4.]),
+            )
+
+        J = build.Jmat(Vec(wells)).toarray()
+        Q = build.Qmat(Vec(wells)).toarray()
+
+        np.testing.assert_array_almost_equal(np.diag(J),[2.,0,0,4.,0,0])
+        np.testing.assert_array_almost_equal(Q.ravel(),[200.,0,2.,6.+200.,0,0])
+
+    def test_constraint_table_nums(self):
+
+        grids = Grids(6)
+
+        build = Builder(grids)
+
+        # the last well has no grids, the second one is out of the subset
+        wells = (
+            Constr((0,),press=100.,prod=[2.]),
+            Constr((4,),press=60.,prod=[1.]),
+            Constr((),press=50.,prod=[]),
+            )
+
+        table = build.table(Vec(wells))
+
+        self.assertEqual(table.nums,3)
+
+        np.testing.assert_array_almost_equal(table.rates(np.full(6,40.)),[120.,20.,0.])
+
+        subset = table.subset(np.array([0,1,2,3,-1,-1]))
+
+        self.assertEqual(subset.nums,3)
+
+        np.testing.assert_array_almost_equal(subset.rates(np.full(4,40.)),[120.,0.,0.])
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Checkpoint, Recorder
+from porsim.prerun import Time, Stepper
+
+from fixtures import impes
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+
+        self.solver = impes()
+
+        self.time = Time.get(2.,nums=6)
+
+    def test_restart_is_bit_for_bit(self):
+
+        for options in (dict,lambda: dict(tstat=True),lambda: dict(stepper=Stepper(0.5))):
+
+            with tempfile.TemporaryDirectory() as folder:
+
+                path = os.path.join(folder,"run")
+
+                self.solver.solve(self.time,3000.,recorder=Recorder(path),**options())
+
+                history = np.copy(Recorder.load(path,"press"))
+
+                checkpoint = Checkpoint(os.path.join(folder,"state"),every=4)
+
+                self.solver.solve(self.time,3000.,recorder=Recorder(path),checkpoint=checkpoint,**options())
+
+                self.solver.solve(self.time,0.,recorder=Recorder(path),restart=checkpoint.path,**options())
+
+                np.testing.assert_array_equal(Recorder.load(path,"press"),history)
+
+    def test_restart_in_memory(self):
+
+        self.solver.solve(self.time,3000.)
+
+        history = np.copy(self.solver._press)
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            checkpoint = Checkpoint(os.path.join(folder,"state"),every=4)
+
+            self.solver.solve(self.time,3000.,checkpoint=checkpoint)
+
+            self.solver.solve(self.time,0.,restart=checkpoint.path)
+
+        self.assertEqual(self.solver.recorder.count,3)
+
+        np.testing.assert_array_equal(self.solver._press,history[:,4:])
+
+    def test_time_mismatch(self):
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            checkpoint = Checkpoint(os.path.join(folder,"state"),every=3)
+
+            self.solver.solve(self.time,3000.,checkpoint=checkpoint)
+
+            with self.assertRaises(ValueError):
+                self.solver.solve(Time.get(1.,nums=6),3000.,restart=checkpoint.path)
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from scipy.sparse import bmat, diags, identity, kron
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import CPR, Direct, Krylov, Multigrid
+
+def coupled(nums,tstep=1e3):
+    """Returns two-phase like system with (p,Sw) unknowns and (water,oil)
+    equations interleaved per grid on nums by nums grids."""
+    one = diags([-np.ones(nums-1),2*np.ones(nums),-np.ones(nums-1)],[-1,0,1])
+
+    K = kron(identity(nums),one)+kron(one,identity(nums))
+
+    rng = np.random.default_rng(0)
+
+    size = nums*nums
+
+    mobw,mobo = diags(0.2+rng.random(size)),diags(0.5+rng.random(size))
+
+    volume = diags(np.full(size,1/tstep))
+
+    LHS = bmat([[-mobw.dot(K),-volume],[-mobo.dot(K),volume]]).tocsr()
+
+    order = np.column_stack((np.arange(size),np.arange(size)+size)).ravel()
+
+    return LHS[order][:,order].tocsr()
+
+class TestCPR(unittest.TestCase):
+
+    def test_weights_decouple_saturation(self):
+
+        LHS = coupled(6)
+
+        W,P = CPR.weights(LHS)
+
+        saturation = W.dot(LHS).toarray()[:,1::2]
+
+        np.testing.assert_allclose(np.diag(saturation),0,atol=1e-12)
+        self.assertEqual(W.dot(LHS).dot(P).shape,(36,36))
+
+    def test_gmres_with_cpr(self):
+
+        LHS = coupled(40)
+        RHS = np.ones(LHS.shape[0])
+
+        exact = Direct()(LHS,RHS)
+
+        for precond in (CPR(),CPR(Multigrid((40,40,1)).operator,"jacobi")):
+
+            backend = Krylov("gmres",precond,rtol=1e-10)
+
+            np.testing.assert_allclose(backend(LHS,RHS),exact,rtol=1e-6)
+
+            self.assertLess(backend.niter,30)
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+
+from unittest import mock
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Cuboid
+
+from fixtures import Grids, Rock
+
+class Water():
+    """Fluid whose mobility array is updated in place."""
+
+    def __init__(self,nums):
+        self._grad,self._comp,self._press = 9800.,4e-10,None
+        self._mobil = np.full(nums,1e-3)
+
+class TestCuboidUpdate(unittest.TestCase):
+
+    def setUp(self):
+
+        self.grids = Grids(5,4,3)
+
+        self.rock,self.water = Rock(self.grids.nums),Water(self.grids.nums)
+
+        self.cuboid = Cuboid(self.grids,self.rock,self.water)
+
+    def test_rock_edited_in_place(self):
+
+        xflow,xcond = np.copy(self.cuboid._xflow),np.copy(self.cuboid._xcond)
+
+        self.rock._xperm *= 2
+
+        self.cuboid.invalidate("flow")
+
+        self.cuboid.rrock = self.rock
+
+        np.testing.assert_allclose(self.cuboid._xflow,2*xflow)
+        np.testing.assert_allclose(self.cuboid._xcond,2*xcond)
+
+        self.rock._xperm /= 4
+
+        self.cuboid.invalidate()
+
+        self.cuboid(rrock=self.rock)
+
+        np.testing.assert_allclose(self.cuboid._xcond,xcond/2)
+
+    def test_fluid_edited_in_place(self):
+
+        self.water._mobil *= 3
+
+        self.cuboid.invalidate("mobil")
+
+        self.cuboid.fluid = self.water
+
+        np.testing.assert_allclose(self.cuboid._mobil,3.)
+
+        self.water._press = np.full(self.grids.nums,2e7)
+
+        self.cuboid.fluid = self.water
+
+        np.testing.assert_allclose(self.cuboid._power-self.cuboid._hhead,2e7)
+
+        self.water._press[0] = 1e7
+
+        self.cuboid.invalidate("power")
+
+        self.cuboid.fluid = self.water
+
+        self.assertAlmostEqual(self.cuboid._power[0]-self.cuboid._hhead[0],1e7)
+
+    def test_unchanged_rock_is_skipped(self):
+
+        with mock.patch.object(Cuboid,"harmonic",wraps=Cuboid.harmonic) as harmonic:
+
+            self.cuboid.rrock = self.rock
+            self.cuboid(rrock=self.rock,fluid=self.water)
+
+            self.assertEqual(harmonic.call_count,0)
+
+            self.rock._yperm = 2*self.rock._yperm
+
+            self.cuboid(rrock=self.rock)
+
+            self.assertEqual(harmonic.call_count,3)
+
+    def test_unchanged_fluid_is_skipped(self):
+
+        mobil,power = self.cuboid._mobil,self.cuboid._power
+
+        self.cuboid.fluid = self.water
+
+        self.assertIs(self.cuboid._mobil,mobil)
+        self.assertIs(self.cuboid._power,power)
+
+if __name__ == "__main__":
+
+    unittest.main()
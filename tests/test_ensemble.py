@@ -0,0 +1,106 @@
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Ensemble
+from porsim._ensemble import _worker
+from porsim.prerun import Time
+
+from fixtures import Grids, Rock, impes
+
+class TestEnsemble(unittest.TestCase):
+
+    def setUp(self):
+
+        grids = Grids(4,3,2)
+
+        self.solver = impes(grids)
+
+        self.time = Time.get(1.,nums=3)
+
+        rng = np.random.default_rng(2)
+
+        self.xperm = 1e-13*np.exp(rng.normal(0,1,(4,grids.nums)))
+        self.poro = 0.1+0.2*rng.random((4,grids.nums))
+
+    def test_matches_single_runs(self):
+
+        outputs = Ensemble(self.solver,self.time,3000.,workers=1).run(_xperm=self.xperm,_poro=self.poro)
+
+        self.assertEqual(outputs["rates"].shape,(4,4,2))
+        self.assertEqual(outputs["press"].shape,(4,4))
+
+        base = self.solver.rrock
+
+        base._xperm,base._poro = self.xperm[2],self.poro[2]
+
+        self.solver.rrock = base
+
+        self.solver.solve(self.time,3000.)
+
+        volume = self.solver._volume*self.poro[2]
+
+        np.testing.assert_allclose(outputs["press"][2],volume.dot(self.solver._press)/volume.sum())
+
+    def test_active_grids_per_realization(self):
+
+        grids = Grids(4,3,2)
+
+        solver = impes(grids,active=True)
+
+        cells = np.copy(solver._cells)
+
+        # each realization pinches out different grids
+        poro = np.full((3,grids.nums),0.2)
+
+        poro[0,[1,14]],poro[1,[9,10]],poro[2,[3,17]] = 0.,0.,0.
+
+        outputs = Ensemble(solver,self.time,3000.,workers=1).run(_poro=poro)
+
+        np.testing.assert_array_equal(solver._cells,cells)
+
+        for index in range(3):
+
+            rock = Rock(grids.nums)
+
+            rock._poro = poro[index]
+
+            single = impes(grids,rock,active=True)
+
+            self.assertEqual(single._cells.size,22)
+
+            single.solve(self.time,3000.)
+
+            volume = single._volume*poro[index]
+
+            np.testing.assert_allclose(outputs["press"][index],volume.dot(single._press)/volume.sum(),rtol=1e-10)
+
+    def test_process_pool(self):
+
+        serial = Ensemble(self.solver,self.time,3000.,workers=1).run(_xperm=self.xperm)
+        pooled = Ensemble(self.solver,self.time,3000.,workers=2,chunk=3).run(_xperm=self.xperm)
+
+        for key in ("rates","press"):
+            np.testing.assert_array_equal(pooled[key],serial[key])
+
+    def test_failed_run_restores_rock(self):
+
+        base = self.solver.rrock
+
+        with self.assertRaises(ValueError):
+            Ensemble(self.solver,self.time,3000.,workers=1).run(_xperm=self.xperm[:,:-1])
+
+        self.assertIs(self.solver.rrock,base)
+        self.assertEqual(_worker,{})
+
+    def test_invalid_property(self):
+
+        with self.assertRaises(ValueError):
+            Ensemble(self.solver,self.time,3000.).run(xperm=self.xperm)
+
+if __name__ == "__main__":
+
+    unittest.main()
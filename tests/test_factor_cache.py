@@ -0,0 +1,92 @@
+import unittest
+
+from unittest import mock
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim._backend import linalg
+from porsim.prerun import Time
+
+from fixtures import Constr, impes
+
+class Liquid():
+    """Fluid of constant mobility and compressibility, so the matrices
+    reused with tstat are exact."""
+
+    def __init__(self):
+        self._grad,self._mobil,self._comp,self._press = 9800.,np.array([1e-3]),1e-9,None
+
+class TestFactorCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.well = Constr((6,21),press=1e7)
+
+        self.solver = impes(wells=(self.well,))
+
+        self.solver.fluid = Liquid()
+
+    def cached(self,steps,conds=None):
+        """Returns the pressures of the tstat run, with the well pressures
+        of conds set after the step indices, and the number of LU
+        factorizations."""
+        self.well._cond,press = 1e7,[]
+
+        with mock.patch.object(linalg,"factorized",wraps=linalg.factorized) as factorized:
+
+            for state in self.solver.run(Time(steps),3000.,tstat=True):
+
+                press.append(np.copy(state._press))
+
+                if state.index in (conds or {}):
+                    self.well._cond = conds[state.index]
+
+        return np.hstack(press),factorized.call_count
+
+    def fresh(self,steps,conds=None):
+        """Returns the pressures solved with new matrices at every step."""
+        self.well._cond,press = 1e7,[]
+
+        for state in self.solver.run(Time(steps),3000.):
+
+            press.append(np.copy(state._press))
+
+            if state.index in (conds or {}):
+                self.well._cond = conds[state.index]
+
+        return np.hstack(press)
+
+    def test_constant_step(self):
+
+        press,count = self.cached([1.]*5)
+
+        self.assertEqual(count,1)
+
+        np.testing.assert_allclose(press,self.fresh([1.]*5),rtol=1e-10)
+
+    def test_step_change(self):
+
+        steps = [1.,1.,2.,2.,2.,1.]
+
+        press,count = self.cached(steps)
+
+        self.assertEqual(count,3)
+
+        np.testing.assert_allclose(press,self.fresh(steps),rtol=1e-10)
+
+    def test_constraint_change(self):
+
+        conds = {2:1.5e7}
+
+        press,count = self.cached([1.]*5,conds)
+
+        self.assertEqual(count,2)
+
+        np.testing.assert_allclose(press,self.fresh([1.]*5,conds),rtol=1e-10)
+
+if __name__ == "__main__":
+
+    unittest.main()
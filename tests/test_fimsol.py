@@ -0,0 +1,143 @@
+import contextlib
+import io
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import FIMSol, SimSol
+
+from fixtures import waterflood
+
+class TestFIMSol(unittest.TestCase):
+
+    def setUp(self):
+
+        self.solver = waterflood(FIMSol,steps=10,tstep=2.,tol=1e-8)
+
+        self.faces = self.solver.faces()
+
+        rng = np.random.default_rng(3)
+
+        self.p = 1500.+100*rng.random(10)
+        self.Sw = 0.25+0.5*rng.random(10)
+
+        self.pn,self.Swn = self.p-10*rng.random(10),self.Sw-0.02
+
+    def test_jacobian_matches_finite_difference(self):
+
+        R,J = self.solver.system(self.p,self.Sw,self.pn,self.Swn,2.,self.faces)
+
+        x,numeric = np.column_stack((self.p,self.Sw)).ravel(),np.zeros((20,20))
+
+        for index in range(20):
+            step = 1e-3 if index%2==0 else 1e-6
+            y = np.copy(x)
+            y[index] += step
+            numeric[:,index] = (self.solver.system(y[0::2],y[1::2],self.pn,self.Swn,2.,self.faces)[0]-R)/step
+
+        np.testing.assert_allclose(J.toarray(),numeric,atol=1e-4*np.abs(numeric).max())
+
+    def test_converges_in_pressure(self):
+
+        # no water is injected, so the first update barely moves the
+        # saturation while the pressure is still far from converged
+        solver = waterflood(FIMSol,tol=1e-4)
+
+        solver.well_limits[0] = 0.
+
+        pn,Swn = solver.pressure[:,0],solver.Sw[:,0]
+
+        p,Sw = solver.newton(pn,Swn,2.,self.faces)
+
+        self.assertGreater(solver.niter,1)
+
+        R,_ = solver.system(p,Sw,pn,Swn,2.,self.faces)
+
+        scale = np.repeat(solver.res.grid_volumes*solver.res.porosity/2.,2)
+
+        self.assertLess(np.max(np.abs(R)/scale),1e-4)
+
+    def test_waterflood(self):
+
+        stdout = io.StringIO()
+
+        with contextlib.redirect_stdout(stdout):
+            self.solver.solve()
+
+        self.assertEqual(stdout.getvalue(),"")
+
+        self.assertLess(self.solver.niter,self.solver.maxiter)
+
+        Sw = self.solver.Sw[:,-1]
+
+        # the water front advances from the injector and the pressure
+        # declines towards the producer
+        self.assertTrue(np.all(np.diff(Sw[:3])<0))
+        self.assertTrue(np.all(np.diff(self.solver.pressure[:,-1])<0))
+        self.assertTrue(np.all((Sw>=0)&(Sw<=1)))
+
+        impes = waterflood(SimSol,steps=10,tstep=2.)
+
+        impes.solve(substeps=True)
+
+        np.testing.assert_allclose(Sw,impes.Sw[:,-1],atol=0.02)
+        np.testing.assert_allclose(self.solver.pressure[:,-1],impes.pressure[:,-1],rtol=0.02)
+
+class TestAdaptiveImplicit(unittest.TestCase):
+
+    def setUp(self):
+
+        self.solver = waterflood(FIMSol,steps=10,tstep=2.,tol=1e-8)
+
+        self.solver.solve()
+
+        self.faces = self.solver.faces()
+
+        self.p,self.Sw = self.solver.pressure[:,5],self.solver.Sw[:,5]
+
+    def test_select(self):
+
+        self.solver.aim = 0.
+
+        self.assertTrue(self.solver.select(self.p,self.Sw,2.,self.faces).all())
+
+        self.solver.aim = 1e9
+
+        self.assertFalse(self.solver.select(self.p,self.Sw,2.,self.faces).any())
+
+    def test_eliminate_matches_full_solve(self):
+
+        implicit = np.zeros(10,dtype=bool)
+
+        implicit[[0,1,2,7]] = True
+
+        p,Sw = self.p+5.,np.clip(self.Sw+0.01,0,1)
+
+        R,J = self.solver.system(p,Sw,self.p,self.Sw,2.,self.faces,implicit)
+
+        np.testing.assert_allclose(self.solver.eliminate(J,R,implicit),self.solver.backend(J,-R),rtol=1e-8,atol=1e-12)
+
+    def test_all_implicit_matches_fully_implicit(self):
+
+        p,Sw = self.solver.newton(self.p,self.Sw,2.,self.faces)
+
+        aim = self.solver.newton(self.p,self.Sw,2.,self.faces,np.ones(10,dtype=bool))
+
+        np.testing.assert_allclose(aim[0],p,rtol=1e-12)
+        np.testing.assert_allclose(aim[1],Sw,rtol=1e-12)
+
+        solver = waterflood(FIMSol,steps=10,tstep=2.,tol=1e-8,aim=0.)
+
+        solver.solve()
+
+        self.assertTrue(solver.implicit.all())
+
+        np.testing.assert_allclose(solver.pressure,self.solver.pressure,rtol=1e-10)
+        np.testing.assert_allclose(solver.Sw,self.solver.Sw,rtol=1e-10)
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from fixtures import Constr, impes
+
+class TestImpesJacobian(unittest.TestCase):
+
+    def setUp(self):
+
+        self.solver = impes()
+
+        rng = np.random.default_rng(1)
+
+        self.press = 2e7+4e6*rng.random(self.solver.nums)
+        self.pprev = 0.98*self.press.reshape((-1,1))
+
+    def residual(self,press,tstep):
+
+        mat = self.solver(press.reshape((-1,1)),tstep)
+
+        return np.asarray(self.solver.residual.implicit(mat,self.pprev,press.reshape((-1,1)))).ravel()
+
+    def test_jacobian_matches_finite_difference(self):
+
+        tstep = 86400.
+
+        mat = self.solver(self.press.reshape((-1,1)),tstep)
+
+        jacobian = self.solver.jacobian(mat,self.press,tstep,self.pprev).toarray()
+
+        resid = self.residual(self.press,tstep)
+
+        numeric = np.zeros_like(jacobian)
+
+        for index in range(self.press.size):
+            press = np.copy(self.press)
+            press[index] += 10.
+            numeric[:,index] = (self.residual(press,tstep)-resid)/10.
+
+        np.testing.assert_allclose(jacobian,numeric,atol=1e-5*np.abs(numeric).max())
+
+    def test_colored_jacobian(self):
+
+        tstep = 86400.
+
+        mat = self.solver(self.press.reshape((-1,1)),tstep)
+
+        analytic = self.solver.jacobian(mat,self.press,tstep,self.pprev).toarray()
+        numeric = self.solver.numeric(mat,self.press,tstep,self.pprev)
+
+        self.assertEqual(self.solver._colors.nums,7)
+
+        np.testing.assert_allclose(numeric.toarray(),analytic,atol=1e-5*np.abs(analytic).max())
+
+    def test_coloring_with_rate_well(self):
+
+        well = Constr((6,21,22),rate=-1e-3)
+
+        coloring = self.solver.coloring((well,))
+
+        pattern = coloring.pattern.tocoo()
+
+        keys = pattern.row*coloring.nums+coloring.colors[pattern.col]
+
+        self.assertEqual(np.unique(keys).size,keys.size)
+        self.assertTrue(coloring.pattern[6,22])
+
+    def test_newton_converges_quadratically(self):
+
+        tstep = 86400.
+
+        Pk,errors = np.copy(self.pprev),[]
+
+        for _ in range(6):
+            mat = self.solver(Pk,tstep)
+            resid = self.solver.residual.implicit(mat,self.pprev,Pk)
+            errors.append(np.linalg.norm(resid))
+            jacobian = self.solver.jacobian(mat,Pk,tstep,self.pprev)
+            Pk = Pk+self.solver.backend(-jacobian.tocsc(),np.asarray(resid).ravel()).reshape((-1,1))
+
+        errors = np.array(errors)/errors[0]
+
+        self.assertLess(errors[-1],1e-10)
+        self.assertLess(errors[2],errors[1]**1.5)
+        self.assertLess(errors[3],errors[2]**1.5)
+
+    def test_jfnk_matches_newton(self):
+
+        tstep = 86400.
+
+        pressures = []
+
+        for jacobian in (True,"jfnk"):
+            mat = self.solver(self.pprev,tstep)
+            mat = self.solver.iterate(mat,self.pprev,tstep,jacobian=jacobian,tol=1e-9)
+            self.assertTrue(self.solver.converged)
+            self.assertLess(self.solver.niter,10)
+            pressures.append(self.solver.iterator.implicit(mat,self.pprev))
+
+        np.testing.assert_allclose(pressures[1],pressures[0],rtol=1e-8)
+
+if __name__ == "__main__":
+
+    unittest.main()
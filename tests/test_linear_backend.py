@@ -0,0 +1,105 @@
+import unittest
+
+import numpy as np
+
+from scipy.sparse import diags, identity, kron
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Direct, Krylov, Multigrid
+
+def poisson(nums,shift=1e-2):
+    """Returns one dimensional T+A like symmetric positive definite matrix."""
+    return diags([-np.ones(nums-1),(2+shift)*np.ones(nums),-np.ones(nums-1)],[-1,0,1]).tocsr()
+
+def cuboid(xnums,ynums,znums,shift=1e-3):
+    """Returns three dimensional 7-point stencil matrix, x-index changing fastest."""
+    one = lambda nums: poisson(nums,0)
+    eye = lambda nums: identity(nums)
+
+    LHS = kron(eye(znums),kron(eye(ynums),one(xnums)))
+    LHS += kron(eye(znums),kron(one(ynums),eye(xnums)))
+    LHS += kron(one(znums),kron(eye(ynums),eye(xnums)))
+
+    return (LHS+shift*identity(xnums*ynums*znums)).tocsr()
+
+class TestLinearBackend(unittest.TestCase):
+
+    def test_krylov_methods(self):
+
+        LHS = poisson(200)
+        RHS = np.linspace(0,1,200)
+
+        exact = Direct()(LHS,RHS)
+
+        for method,precond in (("cg","jacobi"),("bicgstab","ilu"),("gmres","ilu")):
+
+            backend = Krylov(method,precond,rtol=1e-12)
+
+            solution = backend(LHS,RHS)
+
+            self.assertLess(backend.error,1e-10)
+
+            np.testing.assert_allclose(solution,exact,rtol=1e-8)
+
+    def test_warm_start_and_cache(self):
+
+        LHS = poisson(200)
+        RHS = np.linspace(0,1,200)
+
+        backend,cache = Krylov("cg","jacobi",rtol=1e-10),{}
+
+        solution = backend(lambda: LHS,RHS,cache=cache)
+
+        niter = backend.niter
+
+        backend(lambda: None,RHS,x0=solution,cache=cache)
+
+        self.assertIs(cache["LHS"],LHS)
+        self.assertLess(backend.niter,niter)
+
+    def test_multigrid(self):
+
+        iterations = []
+
+        for nums in (8,16,32):
+
+            LHS = cuboid(nums,nums,nums//2)
+            RHS = np.ones(LHS.shape[0])
+
+            multigrid = Multigrid((nums,nums,nums//2),rtol=1e-8,coarsest=64)
+
+            solution = multigrid(LHS,RHS)
+
+            self.assertLess(multigrid.error,1e-8)
+
+            backend = Krylov("cg",multigrid.operator,rtol=1e-10)
+
+            np.testing.assert_allclose(backend(LHS,RHS),solution,rtol=1e-6)
+
+            iterations.append(backend.niter)
+
+        self.assertLess(max(iterations)-min(iterations),10)
+
+    def test_multigrid_maxiter_warning(self):
+
+        LHS = cuboid(16,16,8)
+        RHS = np.ones(LHS.shape[0])
+
+        multigrid = Multigrid((16,16,8),rtol=1e-12,maxiter=2,coarsest=64)
+
+        with self.assertLogs(level="WARNING") as logs:
+            multigrid(LHS,RHS)
+
+        self.assertEqual(multigrid.niter,2)
+        self.assertIn("did not converge in 2 iterations",logs.output[0])
+
+    def test_invalid_method(self):
+
+        with self.assertRaises(ValueError):
+            Krylov("minres")
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,79 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Recorder
+from porsim.prerun import Time
+
+from fixtures import Constr, Grids, impes
+
+class TestRecorder(unittest.TestCase):
+
+    def setUp(self):
+
+        # a line of grids produced at one end and supported at the other
+        self.solver = impes(Grids(10),wells=(Constr((0,),press=1e7),))
+
+        self.time = Time.get(1.,nums=5)
+
+    def test_default_history(self):
+
+        steps = []
+
+        self.solver.solve(self.time,3000.,progress=lambda index,time,press: steps.append(index))
+
+        self.assertEqual(self.solver._press.shape,(10,6))
+        self.assertEqual(steps,list(range(5)))
+
+        np.testing.assert_allclose(self.solver._press[:,0],3000.*6894.76)
+
+    def test_quiet_iterations(self):
+
+        stdout = io.StringIO()
+
+        with contextlib.redirect_stdout(stdout), self.assertLogs(level="WARNING") as logs:
+            self.solver.solve(self.time,3000.,jacobian=True,maxiter=1)
+
+        self.assertEqual(stdout.getvalue(),"")
+        self.assertEqual(len(logs.records),5)
+
+    def test_memory_mapped_store(self):
+
+        self.solver.solve(self.time,3000.)
+
+        history = np.copy(self.solver._press)
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            path = os.path.join(folder,"run")
+
+            recorder = Recorder(path,fields=("press","rates"),every=2,dtype=np.float32)
+
+            self.solver.solve(self.time,3000.,recorder=recorder)
+
+            press = Recorder.load(path,"press")
+            times = Recorder.load(path,"times")
+            rates = Recorder.load(path,"rates")
+
+            self.assertEqual(press.dtype,np.float32)
+            self.assertEqual(rates.shape,(4,2))
+
+            np.testing.assert_allclose(times/86400.,[0.,2.,4.,5.])
+            np.testing.assert_allclose(press,history[:,[0,2,4,5]].T,rtol=1e-6)
+
+            # the well produces, the edge supports the pressure
+            self.assertTrue(np.all(rates[1:,0]<0))
+            self.assertTrue(np.all(rates[1:,1]>0))
+
+            del press,times,rates
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,197 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from scipy.sparse import csr_matrix as csr
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Checkpoint, FIMSol, Filler, SimSol
+from porsim._builder import Pattern
+from porsim._simsol import newton_solver, picard_solver
+
+from fixtures import Corey, Grids, Liquids, Reservoir, Wells, impes, waterflood
+
+class TestTransport(unittest.TestCase):
+
+    def setUp(self):
+
+        self.solver = SimSol(Reservoir(10),Liquids(),Corey(),Wells())
+
+        # total rate of 100 ft3/day through the line of grids, water
+        # injected at the first grid and produced at the last one
+        self.faces = (np.arange(9),np.arange(1,10),np.full(9,100.))
+
+        self.qw,self.qt = np.zeros(10),np.zeros(10)
+
+        self.qw[0],self.qt[0],self.qt[-1] = 100.,100.,-100.
+
+        self.Vp,self.Sw = np.full(10,1e4),np.full(10,0.2)
+
+    def transport(self,tstep):
+        return self.solver.transport(self.Sw,self.Vp,tstep,self.faces,(self.qw,self.qt),0.)
+
+    def test_conserves_water(self):
+
+        Sw = self.transport(200.)
+
+        self.assertGreater(self.solver.substeps,1)
+
+        # the front has not reached the producer, so all injected water stays
+        self.assertEqual(Sw[-1],0.2)
+        self.assertAlmostEqual(self.Vp.dot(Sw-self.Sw),100.*200.)
+
+    def test_bounded_saturation(self):
+
+        for tstep in (1e4,1e5):
+
+            Sw = self.transport(tstep)
+
+            self.assertGreater(self.solver.substeps,tstep/100.)
+
+            self.assertTrue(np.all(Sw>=0.2))
+            self.assertTrue(np.all(Sw<=0.8))
+
+            # the water produced leaves the total injected short
+            self.assertLess(self.Vp.dot(Sw-self.Sw),100.*tstep)
+
+    def test_reversed_face(self):
+
+        # water injected at the grids 1 and 9 flows to the producer at
+        # the grid 5, so the flux of the faces on its right is reversed
+        neg,pos = np.arange(9),np.arange(1,10)
+
+        flux = np.where(pos<=5,50.,-50.)
+
+        flux[0] = 0.
+
+        self.qw[:],self.qt[:] = 0.,0.
+
+        self.qw[[1,9]],self.qt[[1,9]],self.qt[5] = 50.,50.,-100.
+
+        self.faces = (neg,pos,flux)
+
+        Sw = self.transport(1e4)
+
+        self.assertTrue(np.all(Sw>=0.2))
+        self.assertTrue(np.all(Sw<=0.8))
+
+        # the fronts advance alike from both injectors
+        np.testing.assert_allclose(Sw[9:5:-1],Sw[1:5],rtol=1e-10)
+
+        self.assertEqual(Sw[0],0.2)
+
+class TestTmatrix(unittest.TestCase):
+
+    def test_face_list_matches_axis_assembly(self):
+
+        grids = Grids(4,3,2)
+
+        neg = (grids.xneg,grids.yneg,grids.zneg)
+        pos = (grids.xpos,grids.ypos,grids.zpos)
+
+        rng = np.random.default_rng(4)
+
+        values = tuple(rng.random(face.size) for face in neg)
+
+        single = SimSol.tmatrix(np.concatenate(values),np.concatenate(neg),np.concatenate(pos),(grids.nums,)*2)
+
+        axis = csr((grids.nums,)*2)
+
+        for args in zip(values,neg,pos):
+            axis = Filler.tmatrix(axis,*args)
+
+        np.testing.assert_allclose(single.toarray(),axis.toarray(),atol=1e-14)
+        np.testing.assert_allclose(single.toarray(),Pattern(grids.nums,neg,pos).tmatrix(*values).toarray(),atol=1e-14)
+
+        np.testing.assert_allclose(single.sum(axis=1),0.,atol=1e-14)
+
+class TestRestore(unittest.TestCase):
+
+    def test_restart(self):
+
+        for solver in (SimSol,FIMSol):
+
+            with tempfile.TemporaryDirectory() as folder:
+
+                checkpoint = Checkpoint(os.path.join(folder,"state"),every=3)
+
+                history = waterflood(solver,steps=4)
+
+                history.solve(checkpoint=checkpoint)
+
+                restart = waterflood(solver,steps=4)
+
+                restart.solve(restart=checkpoint.path)
+
+                np.testing.assert_array_equal(restart.pressure[:,3:],history.pressure[:,3:])
+                np.testing.assert_array_equal(restart.Sw[:,3:],history.Sw[:,3:])
+
+    def test_mismatch(self):
+
+        for solver in (SimSol,FIMSol):
+
+            with tempfile.TemporaryDirectory() as folder:
+
+                checkpoint = Checkpoint(os.path.join(folder,"state"),every=2)
+
+                waterflood(solver,steps=4).solve(checkpoint=checkpoint)
+
+                state = Checkpoint.load(checkpoint.path)
+
+                for other in (waterflood(solver,steps=4,tstep=2.),waterflood(solver,steps=1),waterflood(solver,nums=8,steps=4)):
+
+                    with self.assertRaises(ValueError):
+                        other.restore(state)
+
+                    self.assertTrue(np.all(other.pressure[:,1:]==0))
+
+class Line():
+
+    def __init__(self,nums,press):
+        self.numtot,self.pressure_initial = nums,np.full(nums,press)
+
+class TestNonlinearSolvers(unittest.TestCase):
+
+    def setUp(self):
+
+        solver = impes()
+
+        mat = solver(np.full((solver.nums,1),2e7),86400.)
+
+        self.grid = Line(solver.nums,2e7)
+
+        self.system = (mat._T,mat._J,mat._Q)
+
+    def solve(self,method,**kwargs):
+        return method(self.grid,86400.,3,*self.system,accum=1e-4,tol=1e-14,stol=1e-3,**kwargs)
+
+    def test_newton_matches_picard(self):
+
+        newton,nstats = self.solve(newton_solver)
+        picard,pstats = self.solve(picard_solver)
+
+        np.testing.assert_allclose(newton,picard,rtol=1e-9)
+
+        self.assertLess(len(nstats),len(pstats))
+
+        errors = [error for step,_,error,_ in nstats if step==0]
+
+        self.assertLess(errors[3],errors[2]**1.5/errors[0]**0.5)
+
+    def test_maxiter_warning(self):
+
+        for method in (newton_solver,picard_solver):
+
+            with self.assertLogs(level="WARNING") as logs:
+                _,stats = self.solve(method,maxiter=2)
+
+            self.assertEqual(len(logs.records),3)
+            self.assertEqual(len(stats),6)
+
+if __name__ == "__main__":
+
+    unittest.main()
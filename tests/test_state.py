@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim.prerun import Time
+
+from fixtures import impes
+
+class TestState(unittest.TestCase):
+
+    def setUp(self):
+
+        self.solver = impes()
+
+        self.time = Time.get(1.,nums=5)
+
+    def test_run_matches_solve(self):
+
+        self.solver.solve(self.time,3000.)
+
+        history = np.copy(self.solver._press)
+
+        for state in self.solver.run(self.time,3000.):
+
+            np.testing.assert_array_equal(state._press,history[:,state.index])
+
+            self.assertAlmostEqual(state.time,state.index*1.)
+            self.assertTrue(state.converged)
+            self.assertIsNone(state.satur)
+
+            np.testing.assert_allclose(state._rates,self.solver.rates(state._press))
+
+        self.assertEqual(state.index,5)
+
+    def test_read_only_and_early_stop(self):
+
+        states = []
+
+        for state in self.solver.run(self.time,3000.):
+
+            states.append(state)
+
+            with self.assertRaises(ValueError):
+                state._press[0] = 0.
+
+            with self.assertRaises(AttributeError):
+                state.index = 0
+
+            if state.press.min()<2900.:
+                break
+
+        self.assertLess(states[-1].index,5)
+        self.assertLess(states[-1].rates[0],0)
+
+    def test_kept_states(self):
+
+        rates = [np.copy(state._rates) for state in self.solver.run(self.time,3000.)]
+
+        states = list(self.solver.run(self.time,3000.))
+
+        for state,expected in zip(states,rates):
+            np.testing.assert_array_equal(state._rates,expected)
+
+        with self.assertRaises(ValueError):
+            states[0]._rates[0] = 0.
+
+if __name__ == "__main__":
+
+    unittest.main()
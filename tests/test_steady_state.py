@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim import Krylov
+
+from fixtures import Constr, impes
+
+class TestSteadyState(unittest.TestCase):
+
+    def setUp(self):
+
+        self.solver = impes()
+
+        self.solver.update(np.full(self.solver.nums,2e7))
+
+    def test_long_time_step_limit(self):
+
+        steady = self.solver.steady()
+
+        mat = self.solver(None,1e20)
+
+        press = self.solver.iterator.implicit(mat,np.full((self.solver.nums,1),2e7))
+
+        np.testing.assert_allclose(steady,press,rtol=1e-8)
+
+    def test_pure_neumann(self):
+
+        injector,producer = Constr((0,),rate=1e-3),Constr((59,),rate=-1e-3)
+
+        self.solver.wells,self.solver.edges = (injector,producer),None
+
+        for backend in (None,Krylov("cg","jacobi",rtol=1e-12)):
+
+            self.solver.backend = backend
+
+            press = self.solver.steady(pref=3000.,index=30)
+
+            mat = self.solver(None,1.)
+
+            resid = np.ravel(mat._Q+mat._G)-mat._T.dot(press)
+
+            self.assertAlmostEqual(press[30],3000.*6894.76)
+            self.assertLess(np.abs(resid).max(),1e-10)
+
+if __name__ == "__main__":
+
+    unittest.main()
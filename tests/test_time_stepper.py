@@ -0,0 +1,43 @@
+import unittest
+
+if __name__ == "__main__":
+    import dirsetup
+
+from porsim.prerun import Stepper
+
+class TestTimeStepper(unittest.TestCase):
+
+    def test_target_events(self):
+
+        stepper = Stepper(5.)
+
+        day = 24*60*60
+
+        self.assertEqual(stepper.target(0.,10*day,[3*day,20*day]),3*day)
+        self.assertEqual(stepper.target(0.,10*day),5*day)
+        self.assertEqual(stepper.target(0.,5.0005*day),5.0005*day)
+
+    def test_grow_and_cut(self):
+
+        stepper = Stepper(1.,maxi=3.,dpmax=100.)
+
+        day = 24*60*60
+
+        stepper.accept(1*day,niter=2)
+        self.assertAlmostEqual(stepper.step,2.)
+
+        stepper.accept(2*day,niter=2)
+        self.assertAlmostEqual(stepper.step,3.)
+
+        stepper.accept(3*day,niter=2,dpress=200*6894.76)
+        self.assertAlmostEqual(stepper.step,1.5)
+
+        stepper.reject(1.5*day)
+        self.assertAlmostEqual(stepper.step,0.75)
+
+        with self.assertRaises(RuntimeError):
+            Stepper(1.,mini=0.6).reject(1*day)
+
+if __name__ == "__main__":
+
+    unittest.main()